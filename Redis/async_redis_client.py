@@ -0,0 +1,407 @@
+"""
+任务注册表的异步（redis.asyncio）版本，MCP 服务器使用的完整接口
+
+键名、字段编码和快照格式在 registry_schema 中定义，与同步版本 redis_client 共用。
+所有客户端共享同一个连接池，连接池大小和健康检查间隔由 redis_config 中的
+max_connections / health_check_interval 配置。
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis.asyncio as aioredis
+
+from .redis_config import get_redis_config
+from .registry_schema import (
+    ALL_TASKS_KEY,
+    CATALOG_SNAPSHOT_KEY,
+    CATALOG_VERSION_KEY,
+    CATEGORY_INDEX_KEY,
+    CATEGORY_INDEX_PREFIX,
+    CATEGORY_INDEX_READY_KEY,
+    QUEUE_INDEX_PREFIX,
+    REGISTRY_PIPELINE_CHUNK_SIZE,
+    RETURN_TYPE_INDEX_PREFIX,
+    SECONDARY_INDEX_READY_KEY,
+    TASK_INDEX_KEY,
+    TASK_REMOVED_KEY,
+    TASK_UPDATES_KEY,
+    build_task_fields,
+    categories_from_counts,
+    category_counts,
+    dump_snapshot,
+    encode_task_updates,
+    flatten_fields,
+    load_snapshot,
+    normalize_fields,
+    parse_task_info,
+    project_task,
+    queue_category_index_rebuild,
+    queue_task_reads,
+    registry_script_args,
+    registry_script_keys,
+    sort_fields,
+    sort_tasks,
+    task_key,
+    task_read_results,
+    to_timestamp,
+)
+from .registry_scripts import REGISTER_TASK_SCRIPT, UPDATE_TASK_SCRIPT, REMOVE_TASK_SCRIPT
+
+# MCP服务器通过stdio通信，stdout只能输出协议消息：本模块和registry_cache等MCP服务器使用的模块
+# 一律通过logging输出诊断信息，不能print
+logger = logging.getLogger(__name__)
+
+# 进程内共享的连接池，首次获取客户端时创建
+_connection_pool: Optional[aioredis.ConnectionPool] = None
+
+
+def get_async_redis_client() -> aioredis.Redis:
+    """获取共享连接池的异步Redis客户端（连接在首次执行命令时建立）"""
+    global _connection_pool
+    if _connection_pool is None:
+        config = dict(get_redis_config())
+        config.setdefault("max_connections", 50)
+        # 连接数达到上限时排队等待空闲连接，而不是直接报错
+        _connection_pool = aioredis.BlockingConnectionPool(**config)
+    return aioredis.Redis(connection_pool=_connection_pool)
+
+async def _read_task_hashes(client: aioredis.Redis, task_names: List[str], fields: Optional[List[str]] = None,
+                            chunk_size: int = REGISTRY_PIPELINE_CHUNK_SIZE) -> List[Dict[str, Any]]:
+    """
+    按块通过pipeline批量读取任务哈希，每块一次网络往返，返回顺序与task_names一致
+
+    指定fields时使用HMGET只读取这些字段，不存在的任务返回空字典
+    """
+    results = []
+    for start in range(0, len(task_names), chunk_size):
+        pipe = client.pipeline(transaction=False)
+        queue_task_reads(pipe, task_names[start:start + chunk_size], fields)
+        results.extend(await pipe.execute())
+    return task_read_results(results, fields)
+
+async def _fetch_tasks(client: aioredis.Redis, task_names: Iterable[str],
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """批量读取并解析任务信息，跳过已不存在的任务"""
+    task_names = list(task_names)
+    return [
+        parse_task_info(task_info)
+        for task_info in await _read_task_hashes(client, task_names, fields)
+        if task_info
+    ]
+
+async def register_celery_task(client: aioredis.Redis, task_name: str, description: str,
+                               parameters: List[Dict[str, Any]], return_type: str = "Any",
+                               category: str = "general", queue: str = "celery",
+                               cacheable: bool = False, cache_ttl: int = 0,
+                               queues: Optional[List[str]] = None) -> bool:
+    """注册Celery任务信息到Redis"""
+    try:
+        now = datetime.now()
+        task_info = build_task_fields(task_name, description, parameters, return_type, category, queue,
+                                       now.isoformat(), cacheable, cache_ttl, queues)
+
+        await client.register_script(REGISTER_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, now.timestamp(), now.isoformat(), *flatten_fields(task_info)))
+        return True
+    except Exception as e:
+        logger.warning(f"注册任务失败: {e}")
+        return False
+
+async def _load_all_tasks(client: aioredis.Redis, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """读取所有任务信息，Redis异常直接抛出"""
+    task_names = await client.smembers(ALL_TASKS_KEY)
+    tasks = sort_tasks(await _fetch_tasks(client, task_names, sort_fields(fields)))
+    return [project_task(task, fields) for task in tasks]
+
+async def get_all_tasks(client: aioredis.Redis, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """获取所有注册的任务信息"""
+    fields = normalize_fields(fields)
+    try:
+        return await _load_all_tasks(client, fields)
+    except Exception as e:
+        logger.warning(f"获取任务列表失败: {e}")
+        return []
+
+async def get_tasks_page(client: aioredis.Redis, cursor: Optional[str] = None, limit: int = 100,
+                         fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    按任务名称字典序分页获取任务信息
+
+    Args:
+        client: Redis客户端
+        cursor: 上一页返回的next_cursor（不指定则从第一页开始）
+        limit: 每页最多返回的任务数
+        fields: 只返回的字段（可选，不指定则返回全部字段）
+
+    Returns:
+        包含tasks和next_cursor（没有下一页时为None）的字典
+    """
+    fields = normalize_fields(fields)
+    if limit <= 0:
+        raise ValueError("limit必须大于0")
+
+    pipe = client.pipeline(transaction=False)
+    pipe.zcard(TASK_INDEX_KEY)
+    pipe.scard(ALL_TASKS_KEY)
+    indexed, total = await pipe.execute()
+    if indexed != total:
+        await rebuild_task_index(client)
+
+    start = f"({cursor}" if cursor else "-"
+    task_names = await client.zrangebylex(TASK_INDEX_KEY, start, "+", start=0, num=limit + 1)
+    has_more = len(task_names) > limit
+    task_names = task_names[:limit]
+
+    tasks = [project_task(task, fields) for task in await _fetch_tasks(client, task_names, fields)]
+    return {
+        "tasks": tasks,
+        "next_cursor": task_names[-1] if has_more else None
+    }
+
+async def rebuild_task_index(client: aioredis.Redis):
+    """根据celery:all_tasks重建按名称排序的任务索引"""
+    task_names = list(await client.smembers(ALL_TASKS_KEY))
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(TASK_INDEX_KEY)
+    for start in range(0, len(task_names), REGISTRY_PIPELINE_CHUNK_SIZE):
+        pipe.zadd(TASK_INDEX_KEY, {task_name: 0 for task_name in task_names[start:start + REGISTRY_PIPELINE_CHUNK_SIZE]})
+    await pipe.execute()
+
+async def get_tasks_by_category(client: aioredis.Redis, category: str) -> List[Dict[str, Any]]:
+    """根据分类获取任务信息"""
+    try:
+        task_names = await client.smembers(f"{CATEGORY_INDEX_PREFIX}{category}")
+        return sort_tasks(await _fetch_tasks(client, task_names))
+    except Exception as e:
+        logger.warning(f"获取分类任务失败: {e}")
+        return []
+
+async def find_tasks(client: aioredis.Redis, queue: Optional[str] = None, return_type: Optional[str] = None,
+                     category: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    按队列、返回类型、分类组合查询任务（对相应索引集合求交集）
+
+    Args:
+        client: Redis客户端
+        queue: 任务队列（可选）
+        return_type: 返回值类型（可选）
+        category: 任务分类（可选）
+
+    Returns:
+        同时满足所有条件的任务信息列表，未指定任何条件时返回全部任务
+    """
+    index_keys = []
+    if category:
+        index_keys.append(f"{CATEGORY_INDEX_PREFIX}{category}")
+    if queue:
+        index_keys.append(f"{QUEUE_INDEX_PREFIX}{queue}")
+    if return_type:
+        index_keys.append(f"{RETURN_TYPE_INDEX_PREFIX}{return_type}")
+    if not index_keys:
+        return await get_all_tasks(client)
+
+    try:
+        if (queue or return_type) and not await client.exists(SECONDARY_INDEX_READY_KEY):
+            await rebuild_secondary_indexes(client)
+        task_names = await client.sinter(index_keys)
+        return sort_tasks(await _fetch_tasks(client, task_names))
+    except Exception as e:
+        logger.warning(f"查询任务失败: {e}")
+        return []
+
+async def get_task_changes(client: aioredis.Redis, since: Any) -> Dict[str, Any]:
+    """
+    获取指定时间之后注册、更新或删除的任务，用于增量同步任务目录
+
+    Args:
+        client: Redis客户端
+        since: Unix时间戳或ISO格式时间（包含该时刻，边界上的变更可能重复返回）
+
+    Returns:
+        包含tasks（变更的任务信息，按变更时间排序）、removed（已删除的任务名称）、
+        timestamp（本次返回的最新变更时间，下次同步时传入）和version的字典
+    """
+    since = to_timestamp(since)
+
+    pipe = client.pipeline(transaction=False)
+    pipe.exists(SECONDARY_INDEX_READY_KEY)
+    pipe.zrangebyscore(TASK_UPDATES_KEY, since, "+inf", withscores=True)
+    pipe.zrangebyscore(TASK_REMOVED_KEY, since, "+inf", withscores=True)
+    pipe.get(CATALOG_VERSION_KEY)
+    ready, updated, removed, version = await pipe.execute()
+
+    if not ready:
+        await rebuild_secondary_indexes(client)
+        return await get_task_changes(client, since)
+
+    scores = [score for _, score in updated] + [score for _, score in removed]
+    return {
+        "tasks": await _fetch_tasks(client, [task_name for task_name, _ in updated]),
+        "removed": [task_name for task_name, _ in removed],
+        "timestamp": max(scores, default=since),
+        "version": int(version or 0)
+    }
+
+async def rebuild_secondary_indexes(client: aioredis.Redis):
+    """根据现有任务哈希重建队列、返回类型索引和变更时间索引"""
+    task_names = list(await client.smembers(ALL_TASKS_KEY))
+    task_infos = await _read_task_hashes(client, task_names, ["queue", "return_type", "last_updated"])
+    stale_keys = [
+        *[key async for key in client.scan_iter(match=f"{QUEUE_INDEX_PREFIX}*", count=1000)],
+        *[key async for key in client.scan_iter(match=f"{RETURN_TYPE_INDEX_PREFIX}*", count=1000)]
+    ]
+
+    pipe = client.pipeline(transaction=True)
+    if stale_keys:
+        pipe.delete(*stale_keys)
+    pipe.delete(TASK_UPDATES_KEY)
+    for task_name, task_info in zip(task_names, task_infos):
+        if not task_info:
+            continue
+        try:
+            updated_at = to_timestamp(task_info.get("last_updated"))
+        except (TypeError, ValueError):
+            updated_at = 0
+        pipe.sadd(f"{QUEUE_INDEX_PREFIX}{task_info.get('queue', 'celery')}", task_name)
+        pipe.sadd(f"{RETURN_TYPE_INDEX_PREFIX}{task_info.get('return_type', 'Any')}", task_name)
+        pipe.zadd(TASK_UPDATES_KEY, {task_name: updated_at})
+    pipe.set(SECONDARY_INDEX_READY_KEY, 1)
+    await pipe.execute()
+
+async def get_tasks_info(client: aioredis.Redis, task_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    批量获取多个任务的详细信息（pipeline批量读取）
+
+    Args:
+        client: Redis客户端
+        task_names: 任务名称列表
+
+    Returns:
+        任务名称到任务信息的字典，未注册的任务对应None
+    """
+    try:
+        unique_names = list(dict.fromkeys(task_names))
+        results = await _read_task_hashes(client, unique_names)
+
+        return {
+            task_name: parse_task_info(task_info) if task_info else None
+            for task_name, task_info in zip(unique_names, results)
+        }
+    except Exception as e:
+        logger.warning(f"批量获取任务信息失败: {e}")
+        return {task_name: None for task_name in task_names}
+
+async def get_task_info(client: aioredis.Redis, task_name: str) -> Optional[Dict[str, Any]]:
+    """获取单个任务的详细信息"""
+    try:
+        task_info = await client.hgetall(task_key(task_name))
+        if not task_info:
+            return None
+        return parse_task_info(task_info)
+    except Exception as e:
+        logger.warning(f"获取任务信息失败: {e}")
+        return None
+
+async def remove_task(client: aioredis.Redis, task_name: str) -> bool:
+    """从Redis中移除任务信息"""
+    try:
+        await client.register_script(REMOVE_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, datetime.now().timestamp()))
+        return True
+    except Exception as e:
+        logger.warning(f"移除任务失败: {e}")
+        return False
+
+async def _load_categories(client: aioredis.Redis) -> List[str]:
+    """读取所有任务分类（必要时补建分类索引），Redis异常直接抛出"""
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(CATEGORY_INDEX_KEY)
+    pipe.exists(CATEGORY_INDEX_READY_KEY)
+    counts, ready = await pipe.execute()
+
+    if not ready:
+        counts = await rebuild_category_index(client)
+
+    return categories_from_counts(counts)
+
+async def get_all_categories(client: aioredis.Redis) -> List[str]:
+    """获取所有任务分类"""
+    try:
+        return await _load_categories(client)
+    except Exception as e:
+        logger.warning(f"获取分类列表失败: {e}")
+        return []
+
+async def rebuild_category_index(client: aioredis.Redis) -> Dict[str, int]:
+    """
+    根据现有的分类集合重建分类索引
+
+    使用SCAN增量遍历分类键，不会像KEYS那样阻塞Redis。
+
+    Args:
+        client: Redis客户端
+
+    Returns:
+        分类名称到任务数的字典
+    """
+    category_keys = [key async for key in client.scan_iter(match=f"{CATEGORY_INDEX_PREFIX}*", count=1000)]
+
+    pipe = client.pipeline(transaction=False)
+    for key in category_keys:
+        pipe.scard(key)
+    counts = category_counts(category_keys, await pipe.execute())
+
+    pipe = client.pipeline(transaction=True)
+    queue_category_index_rebuild(pipe, counts)
+    await pipe.execute()
+    return counts
+
+async def get_catalog_version(client: aioredis.Redis) -> int:
+    """获取任务目录当前版本号（从未注册过任务时为0）"""
+    return int(await client.get(CATALOG_VERSION_KEY) or 0)
+
+async def get_catalog_snapshot(client: aioredis.Redis, if_version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    获取任务目录快照（全部任务和分类），支持按版本号条件获取
+
+    目录未变化时只需一次GET读取版本号；快照过期时根据当前数据重建并写回。
+    重建时读取Redis失败会直接抛出异常，不会把不完整的目录写成快照。
+
+    Args:
+        client: Redis客户端
+        if_version: 客户端已持有的目录版本号（可选）
+
+    Returns:
+        包含version、not_modified，以及目录变化时的tasks和categories的字典
+    """
+    version = await get_catalog_version(client)
+    if if_version is not None and int(if_version) == version:
+        return {"version": version, "not_modified": True}
+
+    snapshot = load_snapshot(await client.get(CATALOG_SNAPSHOT_KEY))
+    if snapshot is None or snapshot["version"] != version:
+        snapshot = {
+            "version": version,
+            "tasks": await _load_all_tasks(client),
+            "categories": await _load_categories(client)
+        }
+        await client.set(CATALOG_SNAPSHOT_KEY, dump_snapshot(snapshot))
+
+    return {"not_modified": False, **snapshot}
+
+async def update_task_info(client: aioredis.Redis, task_name: str, **kwargs) -> bool:
+    """更新任务信息"""
+    try:
+        now = datetime.now()
+        fields = encode_task_updates(kwargs, now.isoformat())
+
+        updated = await client.register_script(UPDATE_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, now.timestamp(), *flatten_fields(fields)))
+        return bool(updated)
+    except Exception as e:
+        logger.warning(f"更新任务信息失败: {e}")
+        return False
@@ -1,8 +1,34 @@
 import redis
-import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional
 from datetime import datetime
 from .redis_config import get_redis_config
+from .registry_scripts import REGISTER_TASK_SCRIPT, UPDATE_TASK_SCRIPT, REMOVE_TASK_SCRIPT
+from .registry_schema import (
+    ALL_TASKS_KEY,
+    CATEGORY_INDEX_KEY,
+    CATEGORY_INDEX_PREFIX,
+    CATEGORY_INDEX_READY_KEY,
+    REGISTRY_PIPELINE_CHUNK_SIZE,
+    build_task_fields,
+    categories_from_counts,
+    category_counts,
+    encode_task_updates,
+    flatten_fields,
+    normalize_fields,
+    parse_task_info,
+    project_task,
+    queue_category_index_rebuild,
+    queue_task_reads,
+    registry_script_args,
+    registry_script_keys,
+    sort_fields,
+    sort_tasks,
+    task_key,
+    task_read_results,
+)
+
+# 同步版本的任务注册表，供脚本和部署工具使用；MCP 服务器使用 async_redis_client 中的完整接口，
+# 两者共用 registry_schema 中的键名和字段编码
 
 
 def get_redis_client():
@@ -16,9 +42,22 @@ def get_redis_client():
         print(f"Redis连接失败: {e}")
         return None
 
+def _fetch_tasks(client: redis.Redis, task_names: Iterable[str],
+                 fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """按块通过pipeline批量读取并解析任务信息，跳过已不存在的任务"""
+    task_names = list(task_names)
+    results = []
+    for start in range(0, len(task_names), REGISTRY_PIPELINE_CHUNK_SIZE):
+        pipe = client.pipeline(transaction=False)
+        queue_task_reads(pipe, task_names[start:start + REGISTRY_PIPELINE_CHUNK_SIZE], fields)
+        results.extend(pipe.execute())
+    return [parse_task_info(task_info) for task_info in task_read_results(results, fields) if task_info]
+
 def register_celery_task(client: redis.Redis, task_name: str, description: str,
                         parameters: List[Dict[str, Any]], return_type: str = "Any",
-                        category: str = "general", queue: str = "celery") -> bool:
+                        category: str = "general", queue: str = "celery",
+                        cacheable: bool = False, cache_ttl: int = 0,
+                        queues: Optional[List[str]] = None) -> bool:
     """
     注册Celery任务信息到Redis
 
@@ -29,72 +68,44 @@ def register_celery_task(client: redis.Redis, task_name: str, description: str,
         parameters: 参数列表
         return_type: 返回值类型
         category: 任务分类
-        queue: 任务队列
+        queue: 任务队列（主队列，队列索引按它建立）
+        cacheable: 任务结果是否只由参数决定、可以缓存
+        cache_ttl: 结果缓存有效期（秒）
+        queues: 与主队列等价的其他队列（同一任务部署的多个副本），发布任务时选负载最低的一个
 
     Returns:
         注册是否成功
     """
     try:
-        task_key = f"celery:task:{task_name}"
-        task_info = {
-            "name": task_name,
-            "description": description,
-            "parameters": json.dumps(parameters, ensure_ascii=False),
-            "return_type": return_type,
-            "category": category,
-            "queue": queue,
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat()
-        }
-
-        client.hset(task_key, mapping=task_info)
-
-        # 同时添加到任务索引中，方便按分类查询
-        client.sadd(f"celery:category:{category}", task_name)
-        client.sadd("celery:all_tasks", task_name)
-
+        now = datetime.now()
+        task_info = build_task_fields(task_name, description, parameters, return_type, category, queue,
+                                      now.isoformat(), cacheable, cache_ttl, queues)
+
+        # 一次原子操作写入任务信息、维护所有索引（含分类、队列变更）并发布缓存失效通知
+        client.register_script(REGISTER_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, now.timestamp(), now.isoformat(), *flatten_fields(task_info)))
         return True
     except Exception as e:
         print(f"注册任务失败: {e}")
         return False
 
-def get_all_tasks(client: redis.Redis) -> List[Dict[str, Any]]:
+def get_all_tasks(client: redis.Redis, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
     获取所有注册的任务信息
 
     Args:
         client: Redis客户端
+        fields: 只返回的字段（可选，不指定则返回全部字段）
 
     Returns:
         任务信息列表
     """
+    fields = normalize_fields(fields)
     try:
-        task_names = client.smembers("celery:all_tasks")
-        tasks = []
-
-        for task_name in task_names:
-            task_key = f"celery:task:{task_name}"
-            task_info = client.hgetall(task_key)
-
-            if task_info:
-                # 解析参数JSON
-                try:
-                    parameters = json.loads(task_info.get("parameters", "[]"))
-                except:
-                    parameters = []
-
-                tasks.append({
-                    "name": task_info.get("name", ""),
-                    "description": task_info.get("description", ""),
-                    "parameters": parameters,
-                    "return_type": task_info.get("return_type", "Any"),
-                    "category": task_info.get("category", "general"),
-                    "queue": task_info.get("queue", "celery"),
-                    "created_at": task_info.get("created_at", ""),
-                    "last_updated": task_info.get("last_updated", "")
-                })
-
-        return sorted(tasks, key=lambda x: x.get("category", ""))
+        task_names = client.smembers(ALL_TASKS_KEY)
+        tasks = sort_tasks(_fetch_tasks(client, task_names, sort_fields(fields)))
+        return [project_task(task, fields) for task in tasks]
     except Exception as e:
         print(f"获取任务列表失败: {e}")
         return []
@@ -111,31 +122,8 @@ def get_tasks_by_category(client: redis.Redis, category: str) -> List[Dict[str,
         该分类下的任务信息列表
     """
     try:
-        task_names = client.smembers(f"celery:category:{category}")
-        tasks = []
-
-        for task_name in task_names:
-            task_key = f"celery:task:{task_name}"
-            task_info = client.hgetall(task_key)
-
-            if task_info:
-                try:
-                    parameters = json.loads(task_info.get("parameters", "[]"))
-                except:
-                    parameters = []
-
-                tasks.append({
-                    "name": task_info.get("name", ""),
-                    "description": task_info.get("description", ""),
-                    "parameters": parameters,
-                    "return_type": task_info.get("return_type", "Any"),
-                    "category": task_info.get("category", "general"),
-                    "queue": task_info.get("queue", "celery"),
-                    "created_at": task_info.get("created_at", ""),
-                    "last_updated": task_info.get("last_updated", "")
-                })
-
-        return tasks
+        task_names = client.smembers(f"{CATEGORY_INDEX_PREFIX}{category}")
+        return sort_tasks(_fetch_tasks(client, task_names))
     except Exception as e:
         print(f"获取分类任务失败: {e}")
         return []
@@ -152,27 +140,12 @@ def get_task_info(client: redis.Redis, task_name: str) -> Optional[Dict[str, Any
         任务信息字典或None
     """
     try:
-        task_key = f"celery:task:{task_name}"
-        task_info = client.hgetall(task_key)
+        task_info = client.hgetall(task_key(task_name))
 
         if not task_info:
             return None
 
-        try:
-            parameters = json.loads(task_info.get("parameters", "[]"))
-        except:
-            parameters = []
-
-        return {
-            "name": task_info.get("name", ""),
-            "description": task_info.get("description", ""),
-            "parameters": parameters,
-            "return_type": task_info.get("return_type", "Any"),
-            "category": task_info.get("category", "general"),
-            "queue": task_info.get("queue", "celery"),
-            "created_at": task_info.get("created_at", ""),
-            "last_updated": task_info.get("last_updated", "")
-        }
+        return parse_task_info(task_info)
     except Exception as e:
         print(f"获取任务信息失败: {e}")
         return None
@@ -189,20 +162,10 @@ def remove_task(client: redis.Redis, task_name: str) -> bool:
         移除是否成功
     """
     try:
-        # 获取任务信息以获得分类
-        task_info = get_task_info(client, task_name)
-        if task_info:
-            category = task_info.get("category", "general")
-            # 从分类索引中移除
-            client.srem(f"celery:category:{category}", task_name)
-
-        # 从全局索引中移除
-        client.srem("celery:all_tasks", task_name)
-
-        # 删除任务信息
-        task_key = f"celery:task:{task_name}"
-        client.delete(task_key)
-
+        # 一次原子操作删除任务信息及其所有索引，并发布缓存失效通知
+        client.register_script(REMOVE_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, datetime.now().timestamp()))
         return True
     except Exception as e:
         print(f"移除任务失败: {e}")
@@ -219,52 +182,65 @@ def get_all_categories(client: redis.Redis) -> List[str]:
         分类列表
     """
     try:
-        # 获取所有分类键
-        category_keys = client.keys("celery:category:*")
-        categories = []
-
-        for key in category_keys:
-            # 提取分类名称
-            category = key.replace("celery:category:", "")
-            # 检查该分类下是否还有任务
-            if client.scard(key) > 0:
-                categories.append(category)
-
-        return sorted(categories)
+        pipe = client.pipeline(transaction=False)
+        pipe.hgetall(CATEGORY_INDEX_KEY)
+        pipe.exists(CATEGORY_INDEX_READY_KEY)
+        counts, ready = pipe.execute()
+
+        # 旧版本注册的数据没有分类索引，首次读取时补建
+        if not ready:
+            counts = rebuild_category_index(client)
+
+        return categories_from_counts(counts)
     except Exception as e:
         print(f"获取分类列表失败: {e}")
         return []
 
-def update_task_info(client: redis.Redis, task_name: str, **kwargs) -> bool:
+def rebuild_category_index(client: redis.Redis) -> Dict[str, int]:
     """
-    更新任务信息
+    根据现有的分类集合重建分类索引
+
+    使用SCAN增量遍历分类键，不会像KEYS那样阻塞Redis。
 
     Args:
         client: Redis客户端
-        task_name: 任务名称
-        **kwargs: 要更新的字段
 
     Returns:
-        更新是否成功
+        分类名称到任务数的字典
     """
-    try:
-        task_key = f"celery:task:{task_name}"
+    category_keys = list(client.scan_iter(match=f"{CATEGORY_INDEX_PREFIX}*", count=1000))
 
-        # 检查任务是否存在
-        if not client.exists(task_key):
-            return False
+    pipe = client.pipeline(transaction=False)
+    for key in category_keys:
+        pipe.scard(key)
+    counts = category_counts(category_keys, pipe.execute())
 
-        # 更新时间戳
-        kwargs["last_updated"] = datetime.now().isoformat()
+    pipe = client.pipeline(transaction=True)
+    queue_category_index_rebuild(pipe, counts)
+    pipe.execute()
+    return counts
 
-        # 如果更新了parameters，需要转换为JSON
-        if "parameters" in kwargs:
-            kwargs["parameters"] = json.dumps(kwargs["parameters"], ensure_ascii=False)
+def update_task_info(client: redis.Redis, task_name: str, **kwargs) -> bool:
+    """
+    更新任务信息
 
-        # 更新字段
-        client.hset(task_key, mapping=kwargs)
+    Args:
+        client: Redis客户端
+        task_name: 任务名称
+        **kwargs: 要更新的字段（只修改queue而不指定queues时，旧主队列会从等价队列中移除）
 
-        return True
+    Returns:
+        更新是否成功
+    """
+    try:
+        now = datetime.now()
+        fields = encode_task_updates(kwargs, now.isoformat())
+
+        # 存在性检查、字段更新、索引维护和失效通知在一个原子脚本中完成
+        updated = client.register_script(UPDATE_TASK_SCRIPT)(
+            keys=registry_script_keys(task_name),
+            args=registry_script_args(task_name, now.timestamp(), *flatten_fields(fields)))
+        return bool(updated)
     except Exception as e:
         print(f"更新任务信息失败: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -21,5 +21,7 @@ def get_redis_config():
         "decode_responses": True,      # 自动解码响应
         "socket_timeout": 30,          # Socket超时时间（秒）
         "socket_connect_timeout": 30,  # 连接超时时间（秒）
-        "retry_on_timeout": True       # 超时时重试
+        "retry_on_timeout": True,      # 超时时重试
+        "max_connections": 50,         # 连接池最大连接数（异步客户端在所有MCP工具间共享）
+        "health_check_interval": 30    # 空闲连接复用前的健康检查间隔（秒）
     }
\ No newline at end of file
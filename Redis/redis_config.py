@@ -10,6 +10,8 @@ def get_redis_config():
         "decode_responses": True,
         "socket_timeout": 30,
         "socket_connect_timeout": 30,
-        "retry_on_timeout": True
+        "retry_on_timeout": True,
+        "max_connections": 50,
+        "health_check_interval": 30
     }
 
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from .registry_schema import REGISTRY_INVALIDATION_CHANNEL
+from .async_redis_client import get_task_info, get_tasks_info
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRegistryCache:
+    """
+    进程内任务注册信息缓存（LRU淘汰）
+
+    任务分发只需要队列等路由信息，这些信息很少变化。缓存命中时分发路径不访问Redis；
+    注册、更新、删除任务的Lua脚本会在失效频道上发布任务名，后台协程订阅该频道
+    并淘汰对应条目，保证多个MCP服务副本之间的一致性。未注册的任务同样会被缓存（值为None），
+    注册后由失效消息清除。
+    """
+
+    def __init__(self, client: Optional[aioredis.Redis], max_size: int = 1024, reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0):
+        """
+        Args:
+            client: 异步Redis客户端（为None时缓存不可用，所有查询直接返回None）
+            max_size: 最多缓存的任务数
+            reconnect_delay: 订阅连接异常后的首次重连间隔（秒），连续失败时加倍
+            max_reconnect_delay: 重连间隔上限（秒）
+        """
+        self.client = client
+        self.max_size = max_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._entries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        # 每次失效递增；加载期间发生过失效的结果不写入缓存，避免回填旧数据
+        self._epoch = 0
+        # 只有订阅处于连接状态时才使用缓存，否则可能漏掉失效消息
+        self._subscribed = False
+        self._listener_task: Optional[asyncio.Task] = None
+
+    def _store(self, task_name: str, task_info: Optional[Dict[str, Any]], epoch: int):
+        if not self._subscribed or epoch != self._epoch:
+            return
+        self._entries[task_name] = task_info
+        self._entries.move_to_end(task_name)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, task_name: str):
+        if not self._subscribed or task_name not in self._entries:
+            return False, None
+        self._entries.move_to_end(task_name)
+        return True, self._entries[task_name]
+
+    async def get(self, task_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务注册信息，未命中时从Redis加载
+
+        Args:
+            task_name: 任务名称
+
+        Returns:
+            任务信息字典或None
+        """
+        if not self.client:
+            return None
+        self.start()
+        hit, task_info = self._lookup(task_name)
+        if hit:
+            return task_info
+        epoch = self._epoch
+        task_info = await get_task_info(self.client, task_name)
+        self._store(task_name, task_info, epoch)
+        return task_info
+
+    async def get_many(self, task_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量获取任务注册信息，未命中的部分一次pipeline从Redis加载
+
+        Args:
+            task_names: 任务名称列表
+
+        Returns:
+            任务名称到任务信息的字典
+        """
+        if not self.client:
+            return {task_name: None for task_name in task_names}
+        self.start()
+
+        found = {}
+        missing = []
+        for task_name in dict.fromkeys(task_names):
+            hit, task_info = self._lookup(task_name)
+            if hit:
+                found[task_name] = task_info
+            else:
+                missing.append(task_name)
+
+        if missing:
+            epoch = self._epoch
+            loaded = await get_tasks_info(self.client, missing)
+            for task_name, task_info in loaded.items():
+                self._store(task_name, task_info, epoch)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, task_name: Optional[str] = None):
+        """使某个任务（task_name为None时为全部）的缓存失效"""
+        self._epoch += 1
+        if task_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(task_name, None)
+
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(REGISTRY_INVALIDATION_CHANNEL)
+                # 订阅建立前的变更无法感知，重新订阅后清空缓存
+                self.invalidate()
+                self._subscribed = True
+                delay = self.reconnect_delay
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Redis长时间不可用时只按退避间隔记录，避免日志刷屏
+                logger.warning(f"任务注册缓存订阅异常，{delay}秒后重连: {e}")
+            finally:
+                self._subscribed = False
+                self.invalidate()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self):
+        """在当前事件循环中启动后台失效订阅（重复调用无副作用）"""
+        if not self.client or (self._listener_task and not self._listener_task.done()):
+            return
+        self._listener_task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        """停止后台订阅"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+        self._listener_task = None
@@ -0,0 +1,231 @@
+"""
+任务注册表的数据约定：键名、字段编码/解析、Lua脚本参数和快照格式
+
+同步客户端（redis_client）与异步客户端（async_redis_client）共用这些纯函数，
+两者只负责执行Redis命令。
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# 批量读取任务哈希时每个pipeline包含的命令数，避免超大目录一次性占满连接缓冲
+REGISTRY_PIPELINE_CHUNK_SIZE = 500
+
+# 任务注册信息变更通知频道，消息内容为发生变更的任务名称
+REGISTRY_INVALIDATION_CHANNEL = "celery:registry:invalidate"
+
+# 任务哈希键前缀与全部任务集合
+TASK_KEY_PREFIX = "celery:task:"
+ALL_TASKS_KEY = "celery:all_tasks"
+
+# 分类索引：分类名称 -> 该分类下的任务数
+CATEGORY_INDEX_KEY = "celery:categories"
+# 分类索引已根据旧数据补建完成的标记
+CATEGORY_INDEX_READY_KEY = "celery:categories:ready"
+
+# 按名称字典序排列的任务索引（有序集合，分值均为0），用于游标分页
+TASK_INDEX_KEY = "celery:task_index"
+
+# 分类、队列、返回类型集合的键前缀，集合成员为任务名称
+CATEGORY_INDEX_PREFIX = "celery:category:"
+QUEUE_INDEX_PREFIX = "celery:queue:"
+RETURN_TYPE_INDEX_PREFIX = "celery:return_type:"
+# 队列、返回类型和变更时间索引已根据旧数据补建完成的标记
+SECONDARY_INDEX_READY_KEY = "celery:indexes:ready"
+
+# 增量同步用的有序集合：任务名称 -> last_updated时间戳 / 删除时间戳
+TASK_UPDATES_KEY = "celery:task_updates"
+TASK_REMOVED_KEY = "celery:task_removed"
+
+# 任务目录版本号（每次注册、更新、删除递增）与对应的序列化快照
+CATALOG_VERSION_KEY = "celery:catalog:version"
+CATALOG_SNAPSHOT_KEY = "celery:catalog:snapshot"
+
+# 任务信息中可投影的字段
+TASK_FIELDS = ("name", "description", "parameters", "return_type",
+               "category", "queue", "queues", "cacheable", "cache_ttl", "created_at", "last_updated")
+
+
+def task_key(task_name: str) -> str:
+    """任务哈希的键"""
+    return f"{TASK_KEY_PREFIX}{task_name}"
+
+
+def queue_list(queue: str, queues: Optional[Iterable[str]] = None) -> List[str]:
+    """主队列在前、去重后的等价队列列表"""
+    result = [queue]
+    for name in queues or []:
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def parse_task_info(task_info: Dict[str, Any]) -> Dict[str, Any]:
+    """将Redis中的任务哈希转换为任务信息字典"""
+    try:
+        parameters = json.loads(task_info.get("parameters", "[]"))
+    except:
+        parameters = []
+    queue = task_info.get("queue", "celery")
+    try:
+        queues = json.loads(task_info.get("queues") or "[]")
+    except ValueError:
+        queues = []
+
+    return {
+        "name": task_info.get("name", ""),
+        "description": task_info.get("description", ""),
+        "parameters": parameters,
+        "return_type": task_info.get("return_type", "Any"),
+        "category": task_info.get("category", "general"),
+        "queue": queue,
+        "queues": queue_list(queue, queues),
+        "cacheable": task_info.get("cacheable") == "1",
+        "cache_ttl": int(task_info.get("cache_ttl") or 0),
+        "created_at": task_info.get("created_at", ""),
+        "last_updated": task_info.get("last_updated", "")
+    }
+
+
+def normalize_fields(fields: Optional[Iterable[str]]) -> Optional[List[str]]:
+    """校验投影字段，结果总是包含name；fields为空时返回None表示读取全部字段"""
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}，可选字段: {', '.join(TASK_FIELDS)}")
+    return list(dict.fromkeys(["name", *fields]))
+
+
+def sort_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """按分类排序需要读取category，投影时再去掉"""
+    return list(dict.fromkeys([*fields, "category"])) if fields else None
+
+
+def project_task(task: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """只保留任务信息中的指定字段（fields为None时原样返回）"""
+    if fields is None:
+        return task
+    return {field: task[field] for field in fields if field in task}
+
+
+def sort_tasks(tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按分类、名称排序任务列表"""
+    return sorted(tasks, key=lambda x: (x.get("category", ""), x.get("name", "")))
+
+
+def queue_task_reads(pipe, task_names: List[str], fields: Optional[List[str]] = None):
+    """把读取任务哈希的命令加入pipeline（指定fields时使用HMGET只读取这些字段）"""
+    for task_name in task_names:
+        if fields:
+            pipe.hmget(task_key(task_name), fields)
+        else:
+            pipe.hgetall(task_key(task_name))
+
+
+def task_read_results(results: List[Any], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """把queue_task_reads的执行结果统一为字典列表，不存在的任务为空字典"""
+    if not fields:
+        return results
+    return [
+        {field: value for field, value in zip(fields, values) if value is not None}
+        for values in results
+    ]
+
+
+def registry_script_keys(task_name: str) -> List[str]:
+    """注册表Lua脚本的KEYS参数"""
+    return [task_key(task_name), ALL_TASKS_KEY, CATEGORY_INDEX_KEY, TASK_INDEX_KEY,
+            CATALOG_VERSION_KEY, TASK_UPDATES_KEY, TASK_REMOVED_KEY]
+
+
+def registry_script_args(task_name: str, timestamp: float, *extra_args) -> List[Any]:
+    """注册表Lua脚本的ARGV参数，timestamp为本次变更时间"""
+    return [task_name, CATEGORY_INDEX_PREFIX, REGISTRY_INVALIDATION_CHANNEL,
+            QUEUE_INDEX_PREFIX, RETURN_TYPE_INDEX_PREFIX, timestamp, *extra_args]
+
+
+def to_timestamp(value: Any) -> float:
+    """将Unix时间戳或ISO格式时间字符串（如last_updated）转换为时间戳"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(value).timestamp()
+
+
+def build_task_fields(task_name: str, description: str, parameters: List[Dict[str, Any]],
+                      return_type: str, category: str, queue: str, now: str,
+                      cacheable: bool = False, cache_ttl: int = 0,
+                      queues: Optional[List[str]] = None) -> Dict[str, Any]:
+    """构造注册时写入任务哈希的字段"""
+    return {
+        "name": task_name,
+        "description": description,
+        "parameters": json.dumps(parameters, ensure_ascii=False),
+        "return_type": return_type,
+        "category": category,
+        "queue": queue,
+        "queues": json.dumps(queue_list(queue, queues), ensure_ascii=False),
+        "cacheable": "1" if cacheable else "0",
+        "cache_ttl": int(cache_ttl) if cacheable else 0,
+        "last_updated": now
+    }
+
+
+def encode_task_updates(updates: Dict[str, Any], now: str) -> Dict[str, Any]:
+    """把update_task_info的关键字参数编码为任务哈希字段"""
+    fields = dict(updates)
+    fields["last_updated"] = now
+    if "parameters" in fields:
+        fields["parameters"] = json.dumps(fields["parameters"], ensure_ascii=False)
+    if "cacheable" in fields:
+        fields["cacheable"] = "1" if fields["cacheable"] else "0"
+    if "queues" in fields:
+        fields["queues"] = json.dumps(list(fields["queues"]), ensure_ascii=False)
+    return fields
+
+
+def flatten_fields(fields: Dict[str, Any]) -> List[Any]:
+    """将字段字典展开为Lua脚本使用的 字段/值 交替列表"""
+    flat = []
+    for field, value in fields.items():
+        flat.extend([field, value])
+    return flat
+
+
+def category_counts(category_keys: List[str], sizes: List[int]) -> Dict[str, int]:
+    """分类集合键及其大小 -> 分类名称到任务数的字典（跳过空分类）"""
+    return {
+        key.replace(CATEGORY_INDEX_PREFIX, ""): size
+        for key, size in zip(category_keys, sizes)
+        if size > 0
+    }
+
+
+def queue_category_index_rebuild(pipe, counts: Dict[str, int]):
+    """把重建分类索引的命令加入（事务）pipeline"""
+    pipe.delete(CATEGORY_INDEX_KEY)
+    if counts:
+        pipe.hset(CATEGORY_INDEX_KEY, mapping=counts)
+    pipe.set(CATEGORY_INDEX_READY_KEY, 1)
+
+
+def categories_from_counts(counts: Dict[str, Any]) -> List[str]:
+    """分类索引 -> 排序后的非空分类列表"""
+    return sorted(category for category, count in counts.items() if int(count) > 0)
+
+
+def dump_snapshot(snapshot: Dict[str, Any]) -> str:
+    """序列化任务目录快照"""
+    return json.dumps(snapshot, ensure_ascii=False)
+
+
+def load_snapshot(payload: Optional[str]) -> Optional[Dict[str, Any]]:
+    """解析快照JSON，内容损坏时返回None以触发重建"""
+    if not payload:
+        return None
+    try:
+        snapshot = json.loads(payload)
+        return snapshot if "version" in snapshot else None
+    except ValueError:
+        return None
@@ -0,0 +1,166 @@
+"""
+任务注册表的Lua脚本
+
+注册、更新、删除任务都在一个脚本内完成（一次网络往返、原子执行），
+同时维护所有索引并发布缓存失效通知。分类、队列、返回类型集合的键由脚本根据
+字段值拼出，因此这些脚本只适用于单实例Redis（本项目的部署方式），不适用于Redis Cluster。
+
+所有脚本的KEYS约定：
+    KEYS[1]: 任务哈希 celery:task:{name}
+    KEYS[2]: 全部任务集合 celery:all_tasks
+    KEYS[3]: 分类索引 celery:categories
+    KEYS[4]: 按名称排序的任务索引 celery:task_index（有序集合，分值均为0，按字典序分页）
+    KEYS[5]: 任务目录版本号 celery:catalog:version（每次变更递增）
+    KEYS[6]: 任务变更时间索引 celery:task_updates（有序集合，分值为last_updated时间戳）
+    KEYS[7]: 已删除任务记录 celery:task_removed（有序集合，分值为删除时间戳）
+ARGV约定：
+    ARGV[1]: 任务名称
+    ARGV[2]: 分类集合键前缀 celery:category:
+    ARGV[3]: 缓存失效频道
+    ARGV[4]: 队列集合键前缀 celery:queue:
+    ARGV[5]: 返回类型集合键前缀 celery:return_type:
+    ARGV[6]: 本次变更的时间戳（秒）
+    ARGV[7...]: 各脚本自己的参数
+"""
+
+# 各脚本共用的索引维护函数
+_COMMON = """
+local function add_to_category(category)
+    if redis.call('SADD', ARGV[2] .. category, ARGV[1]) == 1 then
+        redis.call('HINCRBY', KEYS[3], category, 1)
+    end
+end
+
+local function remove_from_category(category)
+    if redis.call('SREM', ARGV[2] .. category, ARGV[1]) == 1 then
+        if redis.call('HINCRBY', KEYS[3], category, -1) <= 0 then
+            redis.call('HDEL', KEYS[3], category)
+        end
+    end
+end
+
+local function move_category(old_category, new_category)
+    if old_category == new_category then
+        add_to_category(new_category)
+        return
+    end
+    if old_category then
+        remove_from_category(old_category)
+    end
+    add_to_category(new_category)
+end
+
+local function move_index(prefix, old_value, new_value)
+    if old_value and old_value ~= new_value then
+        redis.call('SREM', prefix .. old_value, ARGV[1])
+    end
+    redis.call('SADD', prefix .. new_value, ARGV[1])
+end
+
+local function touch()
+    redis.call('ZADD', KEYS[6], ARGV[6], ARGV[1])
+    redis.call('ZREM', KEYS[7], ARGV[1])
+    redis.call('INCR', KEYS[5])
+    redis.call('PUBLISH', ARGV[3], ARGV[1])
+end
+"""
+
+# 注册任务（已存在时覆盖字段，保留created_at）
+# ARGV[7]: created_at  ARGV[8...]: 字段/值交替排列，必须包含category、queue、return_type
+REGISTER_TASK_SCRIPT = _COMMON + """
+local fields = {}
+local new_values = {category = 'general', queue = 'celery', return_type = 'Any'}
+for i = 8, #ARGV, 2 do
+    fields[#fields + 1] = ARGV[i]
+    fields[#fields + 1] = ARGV[i + 1]
+    if new_values[ARGV[i]] then
+        new_values[ARGV[i]] = ARGV[i + 1]
+    end
+end
+
+local old_category, old_queue, old_return_type = false, false, false
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local old = redis.call('HMGET', KEYS[1], 'category', 'queue', 'return_type')
+    old_category = old[1] or 'general'
+    old_queue = old[2] or 'celery'
+    old_return_type = old[3] or 'Any'
+end
+
+redis.call('HSET', KEYS[1], unpack(fields))
+redis.call('HSETNX', KEYS[1], 'created_at', ARGV[7])
+move_category(old_category, new_values.category)
+move_index(ARGV[4], old_queue, new_values.queue)
+move_index(ARGV[5], old_return_type, new_values.return_type)
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[4], 0, ARGV[1])
+touch()
+return 1
+"""
+
+# 更新已存在任务的部分字段，任务不存在时返回0
+# ARGV[7...]: 字段/值交替排列
+# 只修改queue而未给出queues时，等价队列列表改为新主队列加上原列表中除旧主队列外的队列
+UPDATE_TASK_SCRIPT = _COMMON + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+
+local fields = {}
+local new_values = {}
+for i = 7, #ARGV, 2 do
+    fields[#fields + 1] = ARGV[i]
+    fields[#fields + 1] = ARGV[i + 1]
+    new_values[ARGV[i]] = ARGV[i + 1]
+end
+
+local old = redis.call('HMGET', KEYS[1], 'category', 'queue', 'return_type', 'queues')
+if new_values.category then
+    move_category(old[1] or 'general', new_values.category)
+end
+if new_values.queue then
+    local old_queue = old[2] or 'celery'
+    move_index(ARGV[4], old_queue, new_values.queue)
+    if not new_values.queues then
+        local ok, old_queues = pcall(cjson.decode, old[4] or '[]')
+        if not ok or type(old_queues) ~= 'table' then
+            old_queues = {}
+        end
+        local queues = {new_values.queue}
+        local seen = {[new_values.queue] = true, [old_queue] = true}
+        for _, name in ipairs(old_queues) do
+            if type(name) == 'string' and name ~= '' and not seen[name] then
+                seen[name] = true
+                queues[#queues + 1] = name
+            end
+        end
+        fields[#fields + 1] = 'queues'
+        fields[#fields + 1] = cjson.encode(queues)
+    end
+end
+if new_values.return_type then
+    move_index(ARGV[5], old[3] or 'Any', new_values.return_type)
+end
+
+redis.call('HSET', KEYS[1], unpack(fields))
+touch()
+return 1
+"""
+
+# 删除任务及其所有索引，并记录删除时间供增量同步使用
+REMOVE_TASK_SCRIPT = _COMMON + """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local old = redis.call('HMGET', KEYS[1], 'category', 'queue', 'return_type')
+    remove_from_category(old[1] or 'general')
+    redis.call('SREM', ARGV[4] .. (old[2] or 'celery'), ARGV[1])
+    redis.call('SREM', ARGV[5] .. (old[3] or 'Any'), ARGV[1])
+end
+
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('ZREM', KEYS[6], ARGV[1])
+redis.call('ZADD', KEYS[7], ARGV[6], ARGV[1])
+redis.call('DEL', KEYS[1])
+redis.call('INCR', KEYS[5])
+redis.call('PUBLISH', ARGV[3], ARGV[1])
+return 1
+"""
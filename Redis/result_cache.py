@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# 结果缓存键前缀，完整键为 celery:result_cache:{task_name}:{参数哈希}
+RESULT_CACHE_PREFIX = "celery:result_cache:"
+
+
+class TaskResultCache:
+    """
+    可缓存任务的两级结果缓存：进程内LRU + Redis
+
+    缓存键由任务名称、任务注册时间（last_updated）和参数的哈希组成，任务重新注册或部署后
+    自动使用新键，旧结果随TTL过期。Redis不可用时只使用本地缓存，不影响任务执行。
+    """
+
+    def __init__(self, client: Optional[aioredis.Redis], max_size: int = 1024):
+        """
+        Args:
+            client: 异步Redis客户端（为None时只使用本地缓存）
+            max_size: 本地缓存最多保存的结果数
+        """
+        self.client = client
+        self.max_size = max_size
+        # 缓存键 -> (过期时间, 结果)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(task_name: str, task_version: Any, args: list, kwargs: dict) -> str:
+        """根据任务名称、注册版本和参数生成缓存键（kwargs按键排序，与传参顺序无关）"""
+        payload = json.dumps([task_version, args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{RESULT_CACHE_PREFIX}{task_name}:{digest}"
+
+    def _store_local(self, key: str, result: Any, expires_at: float):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        查询缓存结果
+
+        Args:
+            key: make_key生成的缓存键
+
+        Returns:
+            (是否命中, 结果)，结果本身可能为None，因此单独返回命中标志
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            del self._entries[key]
+
+        if not self.client:
+            return False, None
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            payload, ttl_ms = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"读取结果缓存失败: {e}")
+            return False, None
+        if payload is None:
+            return False, None
+
+        result = json.loads(payload)
+        if ttl_ms and ttl_ms > 0:
+            # 本地副本与Redis中的条目同时过期
+            self._store_local(key, result, time.monotonic() + ttl_ms / 1000)
+        return True, result
+
+    async def set(self, key: str, result: Any, ttl: int):
+        """
+        保存任务结果
+
+        Args:
+            key: make_key生成的缓存键
+            result: 任务结果（必须可JSON序列化，否则不缓存）
+            ttl: 缓存有效期（秒）
+        """
+        if ttl <= 0:
+            return
+        try:
+            payload = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        self._store_local(key, result, time.monotonic() + ttl)
+        if not self.client:
+            return
+        try:
+            await self.client.set(key, payload, ex=ttl)
+        except Exception as e:
+            logger.warning(f"写入结果缓存失败: {e}")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+MCP 服务端的任务准入控制
+
+部署的 worker 通常只有一个进程（worker_prefetch_multiplier=1），发布速度超过处理速度时
+任务会在队列里无限堆积。本模块在发布任务之前做两项限制：
+
+- 每个队列同时进行中的任务数上限（从发布到结果就绪为止）；
+- 每个任务名的令牌桶发布速率。
+
+超出限制的调用最多排队等待 max_wait 秒，仍无法发布时抛出 AdmissionRejected，
+由工具返回明确的背压错误（附带建议的重试等待时间）。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """超出准入限制，调用方应稍后重试"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：每秒补充rate个令牌，最多积累burst个"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        预留一个令牌
+
+        Returns:
+            需要等待的秒数（0表示立即可用）；等待时间超过max_wait时不预留，返回None
+        """
+        self._refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def retry_after(self) -> float:
+        """下一个令牌可用前需要等待的秒数"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """按队列限制进行中任务数、按任务名限制发布速率"""
+
+    def __init__(self, max_inflight: int = 0, queue_limits: Optional[Dict[str, int]] = None,
+                 task_rate: float = 0.0, task_burst: Optional[float] = None,
+                 task_rates: Optional[Dict[str, float]] = None, max_wait: float = 0.0):
+        """
+        Args:
+            max_inflight: 每个队列默认的进行中任务数上限（0表示不限制）
+            queue_limits: 按队列覆盖的进行中任务数上限
+            task_rate: 每个任务名默认的发布速率（次/秒，0表示不限制）
+            task_burst: 令牌桶容量（允许的突发次数），默认与速率相同（至少为1）
+            task_rates: 按任务名覆盖的发布速率
+            max_wait: 超出限制时最多排队等待的秒数（0表示立即拒绝）
+        """
+        self.max_inflight = max_inflight
+        self.queue_limits = queue_limits or {}
+        self.task_rate = task_rate
+        self.task_burst = task_burst
+        self.task_rates = task_rates or {}
+        self.max_wait = max_wait
+
+        self._inflight: Dict[str, int] = {}
+        self._slot_waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def queue_limit(self, queue: str) -> int:
+        return self.queue_limits.get(queue, self.max_inflight)
+
+    def inflight(self, queue: str) -> int:
+        """队列当前进行中的任务数（仅统计有上限的队列）"""
+        return self._inflight.get(queue, 0)
+
+    def _bucket(self, task_name: str) -> Optional[TokenBucket]:
+        rate = self.task_rates.get(task_name, self.task_rate)
+        if not rate or rate <= 0:
+            return None
+        bucket = self._buckets.get(task_name)
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate, self.task_burst or rate)
+            self._buckets[task_name] = bucket
+        return bucket
+
+    def _wake(self, queue: str):
+        """唤醒一个等待该队列空位的调用方"""
+        waiters = self._slot_waiters.get(queue)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+    def _release_slot(self, queue: str):
+        self._inflight[queue] -= 1
+        if self._inflight[queue] <= 0:
+            del self._inflight[queue]
+        self._wake(queue)
+
+    async def _acquire_slot(self, queue: str, limit: int, timeout: float):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._inflight.get(queue, 0) >= limit:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise AdmissionRejected(f"队列 {queue} 进行中的任务已达上限 {limit}")
+            future = loop.create_future()
+            self._slot_waiters.setdefault(queue, deque()).append(future)
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                raise AdmissionRejected(f"队列 {queue} 进行中的任务已达上限 {limit}，等待 {timeout} 秒后仍无空位")
+            except BaseException:
+                # 已被唤醒却不再占用空位时，把机会让给下一个等待者
+                if future.done() and not future.cancelled():
+                    self._wake(queue)
+                raise
+            finally:
+                waiters = self._slot_waiters.get(queue)
+                if waiters is not None:
+                    if future in waiters:
+                        waiters.remove(future)
+                    if not waiters:
+                        del self._slot_waiters[queue]
+        self._inflight[queue] = self._inflight.get(queue, 0) + 1
+
+    async def acquire(self, task_name: str, queue: str,
+                      max_wait: Optional[float] = None) -> Optional[Callable[[], None]]:
+        """
+        发布任务前申请准入，必要时排队等待
+
+        Args:
+            task_name: 任务名称（用于速率限制）
+            queue: 发布的目标队列（用于进行中任务数限制）
+            max_wait: 本次最多等待的秒数（默认使用控制器的max_wait）
+
+        Returns:
+            队列有进行中任务数上限时返回释放函数（任务结束或发布失败时调用，可重复调用），否则返回None
+
+        Raises:
+            AdmissionRejected: 等待max_wait秒后仍超出限制
+        """
+        max_wait = self.max_wait if max_wait is None else max(0.0, min(max_wait, self.max_wait))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        limit = self.queue_limit(queue)
+        if limit and limit > 0:
+            await self._acquire_slot(queue, limit, max_wait)
+            released = False
+
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    self._release_slot(queue)
+        else:
+            release = None
+
+        try:
+            bucket = self._bucket(task_name)
+            if bucket is not None:
+                wait = bucket.reserve(max(0.0, max_wait - (loop.time() - started)))
+                if wait is None:
+                    raise AdmissionRejected(f"任务 {task_name} 发布过于频繁（限速 {bucket.rate:g} 次/秒）",
+                                            retry_after=round(bucket.retry_after(), 3))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+        return release
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Celery 任务消息与结果的序列化和压缩
+
+注册名为 "mcs" 的 kombu 序列化器：底层格式可选 json / msgpack，编码后超过阈值的
+数据再用 zlib 或 lz4 压缩。每条数据带两个字节的头部标明底层格式和压缩方式，
+解码时不依赖本地配置，因此配置不同的 MCP 服务、部署 Worker 和任务 Worker 之间
+仍然可以互通（只要装有对应的依赖）。
+
+环境变量：
+    MCS_SERIALIZER: json（默认）或 msgpack
+    MCS_COMPRESSION: none（默认）、zlib 或 lz4
+    MCS_COMPRESSION_THRESHOLD: 编码后超过该字节数才压缩（默认 1024）
+
+默认配置（json、不压缩）下消息仍以标准 json 格式发送，只认 json 的旧 Worker 可以照常消费；
+启用 msgpack 或压缩后才改用 mcs 格式（TASK_SERIALIZER），此前需要先升级所有 Worker。
+
+本文件在 deploy_mcp/ 下有一份相同的副本，部署任务时也会随代码一起上传到任务 Worker。
+"""
+import datetime
+import decimal
+import logging
+import os
+import uuid
+import zlib
+from typing import Any, List
+
+from kombu.serialization import register
+from kombu.utils.json import dumps as json_dumps, loads as json_loads
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_NAME = 'mcs'
+CODEC_CONTENT_TYPE = 'application/x-mcs'
+# 同时接受旧版本发送的 json 消息和结果
+ACCEPT_CONTENT = [CODEC_NAME, 'json']
+
+SERIALIZER = os.getenv('MCS_SERIALIZER', 'json').lower()
+COMPRESSION = os.getenv('MCS_COMPRESSION', 'none').lower()
+COMPRESSION_THRESHOLD = int(os.getenv('MCS_COMPRESSION_THRESHOLD', '1024'))
+
+if SERIALIZER == 'msgpack' and msgpack is None:
+    logger.warning("未安装 msgpack，MCS_SERIALIZER 回退为 json")
+    SERIALIZER = 'json'
+if COMPRESSION == 'lz4' and lz4_frame is None:
+    logger.warning("未安装 lz4，MCS_COMPRESSION 回退为 zlib")
+    COMPRESSION = 'zlib'
+
+# 任务消息和结果使用的序列化器：只有显式启用 msgpack 或压缩时才用 mcs
+TASK_SERIALIZER = CODEC_NAME if SERIALIZER != 'json' or COMPRESSION != 'none' else 'json'
+
+# 头部第一个字节：底层格式；第二个字节：压缩方式
+_FORMAT_JSON = b'j'
+_FORMAT_MSGPACK = b'm'
+_COMPRESS_NONE = b'-'
+_COMPRESS_ZLIB = b'z'
+_COMPRESS_LZ4 = b'4'
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """msgpack 不支持的类型按 json 序列化器的习惯转换为字符串"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"无法序列化类型 {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """按当前配置序列化对象，超过阈值时压缩"""
+    if SERIALIZER == 'msgpack':
+        fmt, body = _FORMAT_MSGPACK, msgpack.packb(obj, use_bin_type=True, default=_msgpack_default)
+    else:
+        fmt, body = _FORMAT_JSON, json_dumps(obj).encode('utf-8')
+
+    compression = _COMPRESS_NONE
+    if COMPRESSION != 'none' and len(body) > COMPRESSION_THRESHOLD:
+        if COMPRESSION == 'lz4':
+            compression, body = _COMPRESS_LZ4, lz4_frame.compress(body)
+        else:
+            compression, body = _COMPRESS_ZLIB, zlib.compress(body)
+    return fmt + compression + body
+
+
+def loads(data: Any) -> Any:
+    """根据头部解压并反序列化"""
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    data = bytes(data)
+    fmt, compression, body = data[:1], data[1:2], data[2:]
+
+    if compression == _COMPRESS_ZLIB:
+        body = zlib.decompress(body)
+    elif compression == _COMPRESS_LZ4:
+        if lz4_frame is None:
+            raise RuntimeError("收到 lz4 压缩的数据，但未安装 lz4")
+        body = lz4_frame.decompress(body)
+    elif compression != _COMPRESS_NONE:
+        raise ValueError(f"未知的压缩方式: {compression!r}")
+
+    if fmt == _FORMAT_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("收到 msgpack 格式的数据，但未安装 msgpack")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    if fmt == _FORMAT_JSON:
+        return json_loads(body)
+    raise ValueError(f"未知的序列化格式: {fmt!r}")
+
+
+def codec_requirements() -> List[str]:
+    """当前配置下任务 Worker 需要额外安装的依赖"""
+    requirements = []
+    if SERIALIZER == 'msgpack':
+        requirements.append('msgpack')
+    if COMPRESSION == 'lz4':
+        requirements.append('lz4')
+    return requirements
+
+
+def codec_environment() -> dict:
+    """传给任务 Worker 容器的编解码配置，使其结果与 MCP 服务采用相同格式"""
+    return {
+        'MCS_SERIALIZER': SERIALIZER,
+        'MCS_COMPRESSION': COMPRESSION,
+        'MCS_COMPRESSION_THRESHOLD': str(COMPRESSION_THRESHOLD),
+    }
+
+
+register(CODEC_NAME, dumps, loads, content_type=CODEC_CONTENT_TYPE, content_encoding='binary')
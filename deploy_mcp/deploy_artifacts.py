@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+部署制品的传输通道（MCP 服务与部署 Worker 共用，deploy_mcp 目录下有相同的副本）
+
+MCP 服务把需要上传的文件打成 tar.gz 流，边压缩边按块写入结果后端库：
+
+    mcs:artifact:{id}       哈希：chunks（块数）、size（总字节数）
+    mcs:artifact:{id}:{i}   第 i 块的内容
+
+部署 Worker 按块读取并流式解包到部署目录，保留原始的目录结构。两端任何时候都只在内存中
+保留一块数据，与项目大小无关；部署任务消息中只携带制品引用，不再内嵌文件内容。
+"""
+import hashlib
+import os
+import tarfile
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+ARTIFACT_PREFIX = "mcs:artifact:"
+# 每块的字节数与制品在Redis中的保留时间（秒），部署完成后由部署Worker删除
+ARTIFACT_CHUNK_SIZE = int(os.getenv('MCS_ARTIFACT_CHUNK_SIZE', '1048576'))
+ARTIFACT_TTL = int(os.getenv('MCS_ARTIFACT_TTL', '3600'))
+
+_COPY_BUFFER = 64 * 1024
+
+
+def _meta_key(artifact_id: str) -> str:
+    return f"{ARTIFACT_PREFIX}{artifact_id}"
+
+
+def _chunk_key(artifact_id: str, index: int) -> str:
+    return f"{ARTIFACT_PREFIX}{artifact_id}:{index}"
+
+
+def file_digest(path: str) -> str:
+    """流式计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_COPY_BUFFER), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def safe_join(root: str, relative_path: str) -> str:
+    """把制品/清单中的相对路径拼到root下，拒绝绝对路径和越出root的路径"""
+    normalized = relative_path.replace('\\', '/')
+    parts = [part for part in normalized.split('/') if part not in ('', '.')]
+    if normalized.startswith('/') or not parts or '..' in parts:
+        raise ValueError(f"非法的文件路径: {relative_path}")
+    return os.path.join(root, *parts)
+
+
+class _ChunkWriter:
+    """tarfile的输出对象：缓冲写入的数据，每满一块写入一个Redis键"""
+
+    def __init__(self, client, artifact_id: str, chunk_size: int, ttl: int):
+        self.client = client
+        self.artifact_id = artifact_id
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.buffer = bytearray()
+        self.chunks = 0
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        self.size += len(data)
+        while len(self.buffer) >= self.chunk_size:
+            self._flush_chunk(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def _flush_chunk(self, chunk: bytes):
+        self.client.set(_chunk_key(self.artifact_id, self.chunks), chunk, ex=self.ttl)
+        self.chunks += 1
+
+    def close(self):
+        if self.buffer:
+            self._flush_chunk(bytes(self.buffer))
+            self.buffer.clear()
+
+
+class _ChunkReader:
+    """tarfile的输入对象：按需逐块读取Redis键"""
+
+    def __init__(self, client, artifact_id: str, chunks: int):
+        self.client = client
+        self.artifact_id = artifact_id
+        self.chunks = chunks
+        self.index = 0
+        self.chunk = b''
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self.offset >= len(self.chunk):
+                if self.index >= self.chunks:
+                    break
+                self.chunk = self.client.get(_chunk_key(self.artifact_id, self.index))
+                if self.chunk is None:
+                    raise KeyError(f"制品 {self.artifact_id} 的第 {self.index} 块不存在或已过期")
+                self.index += 1
+                self.offset = 0
+            available = len(self.chunk) - self.offset
+            take = available if size < 0 else min(size, available)
+            parts.append(self.chunk[self.offset:self.offset + take])
+            self.offset += take
+            if size > 0:
+                size -= take
+        return b''.join(parts)
+
+
+def upload_files(client, files: Iterable[Tuple[str, str]], chunk_size: Optional[int] = None,
+                 ttl: Optional[int] = None) -> Dict[str, Any]:
+    """
+    把文件打包为tar.gz流并分块写入Redis
+
+    Args:
+        client: 同步Redis客户端（结果后端库）
+        files: (制品内的相对路径, 本地文件路径) 序列
+        chunk_size: 每块的字节数，默认MCS_ARTIFACT_CHUNK_SIZE
+        ttl: 保留时间（秒），默认MCS_ARTIFACT_TTL
+
+    Returns:
+        制品引用 {"id", "chunks", "size", "files"}，作为部署任务参数传给部署Worker
+    """
+    artifact_id = uuid.uuid4().hex
+    ttl = ttl or ARTIFACT_TTL
+    writer = _ChunkWriter(client, artifact_id, chunk_size or ARTIFACT_CHUNK_SIZE, ttl)
+    count = 0
+    try:
+        with tarfile.open(fileobj=writer, mode='w|gz') as tar:
+            for arcname, path in files:
+                # 按文件内容打包（符号链接打包为其指向的文件）
+                with open(path, 'rb') as f:
+                    tar.addfile(tar.gettarinfo(arcname=arcname, fileobj=f), f)
+                count += 1
+        writer.close()
+        client.hset(_meta_key(artifact_id), mapping={"chunks": writer.chunks, "size": writer.size})
+        client.expire(_meta_key(artifact_id), ttl)
+    except BaseException:
+        delete_artifact(client, {"id": artifact_id, "chunks": writer.chunks + 1})
+        raise
+    return {"id": artifact_id, "chunks": writer.chunks, "size": writer.size, "files": count}
+
+
+def extract_artifact(client, artifact: Dict[str, Any], dest_dir: str) -> Dict[str, str]:
+    """
+    流式解包制品到dest_dir，保留目录结构，同时计算每个文件的SHA-256
+
+    Args:
+        client: 同步Redis客户端（结果后端库）
+        artifact: upload_files返回的制品引用
+        dest_dir: 目标目录
+
+    Returns:
+        {相对路径: SHA-256}
+
+    Raises:
+        KeyError: 制品不存在、不完整或已过期
+        ValueError: 制品中包含非法路径
+    """
+    meta = client.hgetall(_meta_key(artifact["id"]))
+    if not meta:
+        raise KeyError(f"制品 {artifact['id']} 不存在或已过期")
+    chunks = int(meta.get(b"chunks", meta.get("chunks", 0)))
+    reader = _ChunkReader(client, artifact["id"], chunks)
+
+    digests = {}
+    with tarfile.open(fileobj=reader, mode='r|gz') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            dest_path = safe_join(dest_dir, member.name)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            digest = hashlib.sha256()
+            source = tar.extractfile(member)
+            with open(dest_path, 'wb') as f:
+                for block in iter(lambda: source.read(_COPY_BUFFER), b''):
+                    digest.update(block)
+                    f.write(block)
+            digests[member.name] = digest.hexdigest()
+    return digests
+
+
+def delete_artifact(client, artifact: Dict[str, Any]):
+    """删除制品的所有块"""
+    keys = [_meta_key(artifact["id"])] + [_chunk_key(artifact["id"], i) for i in range(int(artifact.get("chunks", 0)))]
+    client.delete(*keys)
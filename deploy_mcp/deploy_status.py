@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步部署任务的状态记录（MCP 服务与部署 Worker 共用，deploy_mcp 目录下有相同的副本）
+
+deploy_task 立即返回部署ID，部署过程的各阶段状态记录在结果后端库的哈希中：
+
+    mcs:deploy:{id}   status / stage / error / registration / result 以及每个阶段的
+                      {stage}:state、{stage}:started_at、{stage}:finished_at、{stage}:error、{stage}:detail
+
+阶段依次为 upload（MCP 服务上传、部署 Worker 接收文件）、build（构建镜像）、start（启动容器）、
+ready（容器在运行且 Worker 已开始消费队列）、registered（MCP 服务注册任务）。
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEPLOY_STATUS_PREFIX = "mcs:deploy:"
+# 部署状态记录的保留时间（秒）
+DEPLOY_STATUS_TTL = int(os.getenv('MCS_DEPLOY_STATUS_TTL', '86400'))
+
+DEPLOY_STAGES = ("upload", "build", "start", "ready", "registered")
+
+# 部署与各阶段的状态
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+
+
+def deploy_status_key(deployment_id: str) -> str:
+    return f"{DEPLOY_STATUS_PREFIX}{deployment_id}"
+
+
+def stage_fields(stage: str, state: str, error: Optional[str] = None,
+                 detail: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    阶段状态变化时需要写入的字段
+
+    Args:
+        stage: 阶段名（DEPLOY_STAGES之一）
+        state: RUNNING / SUCCESS / FAILED
+        error: 失败原因（state为FAILED时），同时把整个部署标记为失败
+        detail: 阶段的附加信息（如镜像名、容器ID）
+
+    Returns:
+        哈希字段
+    """
+    now = datetime.now().isoformat()
+    fields = {"stage": stage, f"{stage}:state": state, "updated_at": now}
+    if state == RUNNING:
+        fields[f"{stage}:started_at"] = now
+    else:
+        fields[f"{stage}:finished_at"] = now
+    if state == FAILED:
+        fields["status"] = FAILED
+        fields["error"] = fields[f"{stage}:error"] = error or "未知错误"
+    if detail:
+        fields[f"{stage}:detail"] = json.dumps(detail, ensure_ascii=False, default=str)
+    return fields
+
+
+def _text(value: Any) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _json(value: Optional[str]) -> Any:
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return value
+
+
+def parse_deploy_status(raw: Dict[Any, Any]) -> Optional[Dict[str, Any]]:
+    """把状态哈希还原为字典，记录不存在时返回None"""
+    if not raw:
+        return None
+    data = {_text(k): _text(v) for k, v in raw.items()}
+    stages = {}
+    for stage in DEPLOY_STAGES:
+        stages[stage] = {
+            "state": data.get(f"{stage}:state", PENDING),
+            "started_at": data.get(f"{stage}:started_at"),
+            "finished_at": data.get(f"{stage}:finished_at"),
+            "error": data.get(f"{stage}:error"),
+            "detail": _json(data.get(f"{stage}:detail")),
+        }
+    return {
+        "deployment_id": data.get("deployment_id"),
+        "task_name": data.get("task_name"),
+        "queue": data.get("queue"),
+        "status": data.get("status", PENDING),
+        "stage": data.get("stage"),
+        "error": data.get("error"),
+        "created_at": data.get("created_at"),
+        "updated_at": data.get("updated_at"),
+        "deadline": float(data["deadline"]) if data.get("deadline") else None,
+        "stages": stages,
+        "result": _json(data.get("result")),
+        "registration": _json(data.get("registration")),
+    }
+
+
+class DeployStageTracker:
+    """部署Worker一侧的阶段记录（同步Redis客户端），写入失败只记录日志，不影响部署"""
+
+    def __init__(self, client, deployment_id: Optional[str]):
+        """
+        Args:
+            client: 同步Redis客户端（结果后端库）
+            deployment_id: MCP服务创建的部署ID，为None时（直接调用部署任务）不记录
+        """
+        self.client = client
+        self.deployment_id = deployment_id
+        self.stage = DEPLOY_STAGES[0]
+
+    def _write(self, fields: Dict[str, str]):
+        if not self.deployment_id:
+            return
+        key = deploy_status_key(self.deployment_id)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, DEPLOY_STATUS_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录部署 {self.deployment_id} 的阶段状态失败: {e}")
+
+    def start(self, stage: str):
+        self.stage = stage
+        self._write(stage_fields(stage, RUNNING))
+
+    def done(self, stage: str, detail: Optional[Dict[str, Any]] = None):
+        self.stage = stage
+        self._write(stage_fields(stage, SUCCESS, detail=detail))
+
+    def fail(self, error: str):
+        """把当前阶段（及整个部署）标记为失败"""
+        self._write(stage_fields(self.stage, FAILED, error=error))
+
+
+def deadline_passed(status: Dict[str, Any], grace: float = 0.0) -> bool:
+    """部署是否已超过期限（加上grace秒的宽限）仍未结束"""
+    deadline = status.get("deadline")
+    return (status.get("status") not in (SUCCESS, FAILED)
+            and deadline is not None and time.time() > deadline + grace)
@@ -2,16 +2,24 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import shutil
 import subprocess
+import threading
+import time
 import uuid
 import json
 import logging
 import base64
+import hashlib
 from pathlib import Path
 from typing import Dict, Any, List
 from celery import Celery
 from urllib.parse import quote
+import redis
+from celery_codec import TASK_SERIALIZER, ACCEPT_CONTENT, codec_environment, codec_requirements
+from deploy_artifacts import delete_artifact, extract_artifact, file_digest, safe_join
+from deploy_status import DeployStageTracker
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
@@ -51,9 +59,10 @@ celery_app = Celery('mcp_app',
 
 # Celery 配置
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    task_serializer=TASK_SERIALIZER,
+    accept_content=ACCEPT_CONTENT,
+    result_serializer=TASK_SERIALIZER,
+    result_accept_content=ACCEPT_CONTENT,
     timezone='UTC',
     enable_utc=True,
     worker_prefetch_multiplier=1,
@@ -61,6 +70,158 @@ celery_app.conf.update(
     result_expires=3600,
 )
 
+# 按代码内容哈希标记镜像，内容未变化时复用已有镜像而不重新构建（0关闭）
+REUSE_IMAGES = os.getenv('MCS_DEPLOY_REUSE_IMAGES', '1') != '0'
+
+# 任务Worker共用的基础镜像：预装Celery运行时和编解码依赖，生成的Dockerfile通过 ARG MCS_BASE_IMAGE 引用
+BASE_IMAGE_ARG = 'MCS_BASE_IMAGE'
+BASE_IMAGE_NAME = os.getenv('MCS_BASE_IMAGE_NAME', 'mcs-celery-base')
+BASE_IMAGE_VERSION = os.getenv('MCS_BASE_IMAGE_VERSION', '1')
+BASE_PYTHON_IMAGE = os.getenv('MCS_BASE_PYTHON_IMAGE', 'python:3.11-slim')
+# 额外预装到基础镜像中的包（空格分隔），如 "requests pymongo"
+BASE_EXTRA_PACKAGES = os.getenv('MCS_BASE_EXTRA_PACKAGES', '').split()
+_base_image_lock = threading.Lock()
+
+# 容器启动后等待其中的Worker开始消费队列的最长秒数，以及检查间隔
+READY_TIMEOUT = float(os.getenv('MCS_DEPLOY_READY_TIMEOUT', '30'))
+READY_POLL_INTERVAL = float(os.getenv('MCS_DEPLOY_READY_POLL_INTERVAL', '1'))
+
+# 内容寻址存储：按SHA-256保存上传过的文件，重复部署时只需传输新增或修改的文件
+CAS_DIR = os.getenv('MCS_DEPLOY_CAS_DIR', os.path.join(os.getcwd(), 'code', '.cas'))
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def cas_path(digest: str) -> str:
+    """文件摘要在内容存储中的路径"""
+    if not _DIGEST_PATTERN.match(digest or ''):
+        raise ValueError(f"无效的文件摘要: {digest}")
+    return os.path.join(CAS_DIR, digest[:2], digest)
+
+def cas_has(digest: str) -> bool:
+    return os.path.isfile(cas_path(digest))
+
+def cas_put_file(digest: str, src_path: str):
+    """把已核对摘要的文件复制到内容存储（先写临时文件再原子替换，避免并发部署读到不完整的文件）"""
+    path = cas_path(digest)
+    if os.path.isfile(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, path)
+
+def decode_file_content(file_info: Dict[str, Any]) -> bytes:
+    """将files_content中的文件信息还原为原始字节"""
+    if file_info.get('type') == 'binary' and file_info.get('encoding') == 'base64':
+        return base64.b64decode(file_info['content'])
+    return file_info['content'].encode('utf-8')
+
+# 部署制品（tar.gz分块）所在的Redis（结果后端库）
+artifact_client = redis.Redis.from_url(BACKEND_URL)
+
+@celery_app.task(name='mcp_app.negotiate_deploy_manifest', queue='deploy')
+def negotiate_deploy_manifest(digests: List[str]) -> Dict[str, Any]:
+    """
+    部署前的清单协商：返回内容存储中还没有的文件摘要
+
+    Args:
+        digests: 本次部署所有文件的SHA-256摘要
+
+    Returns:
+        {"success": True, "missing": [...]}，调用方只需上传missing中的文件
+    """
+    try:
+        missing = [digest for digest in dict.fromkeys(digests) if not cas_has(digest)]
+        return {
+            "success": True,
+            "missing": missing,
+            "message": f"共 {len(set(digests))} 个文件，需要上传 {len(missing)} 个"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "missing": list(dict.fromkeys(digests))
+        }
+
+def base_dockerfile() -> str:
+    """基础镜像的Dockerfile"""
+    packages = ' '.join(f'"{package}"' for package in ['celery[redis]', 'redis', *codec_requirements(), *BASE_EXTRA_PACKAGES])
+    return (
+        f"FROM {BASE_PYTHON_IMAGE}\n"
+        f"LABEL mcs.base-image-version={BASE_IMAGE_VERSION}\n"
+        "ENV PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1 PIP_NO_CACHE_DIR=1\n"
+        "WORKDIR /app\n"
+        f"RUN pip install {packages}\n"
+    )
+
+
+def base_image_name() -> str:
+    """基础镜像的完整名称：版本号加Dockerfile内容哈希，依赖变化时自动换用新标签"""
+    content_hash = hashlib.sha256(base_dockerfile().encode('utf-8')).hexdigest()
+    return f"{BASE_IMAGE_NAME}:v{BASE_IMAGE_VERSION}-{content_hash[:8]}"
+
+
+def uses_base_image(dockerfile_path: str) -> bool:
+    """Dockerfile是否通过 ARG MCS_BASE_IMAGE 引用共用基础镜像"""
+    try:
+        with open(dockerfile_path, 'r', encoding='utf-8', errors='replace') as f:
+            return BASE_IMAGE_ARG in f.read()
+    except OSError:
+        return False
+
+
+def ensure_base_image(force: bool = False) -> Dict[str, Any]:
+    """
+    确保本地存在当前版本的基础镜像，不存在时构建
+
+    Args:
+        force: 已存在时也重新构建（如需更新基础Python镜像的安全补丁）
+
+    Returns:
+        构建结果（built 表示本次是否进行了构建）
+    """
+    full_image_name = base_image_name()
+    with _base_image_lock:
+        if not force and image_exists(full_image_name):
+            return {"success": True, "image_name": full_image_name, "built": False, "log": ""}
+
+        build_path = os.path.join(os.getcwd(), 'code', '.base', full_image_name.rsplit(':', 1)[1])
+        os.makedirs(build_path, exist_ok=True)
+        with open(os.path.join(build_path, 'Dockerfile'), 'w', encoding='utf-8') as f:
+            f.write(base_dockerfile())
+
+        logger.info(f"构建基础镜像: {full_image_name}")
+        try:
+            # 同时标记为latest，便于在部署Worker之外手动构建生成的Dockerfile
+            result = subprocess.run(['docker', 'build', '-t', full_image_name,
+                                     '-t', f"{BASE_IMAGE_NAME}:latest", build_path],
+                                    capture_output=True, text=True, timeout=1800)
+        except subprocess.TimeoutExpired:
+            return {"success": False, "error": "基础镜像构建超时", "log": ""}
+        if result.returncode != 0:
+            logger.error(f"基础镜像构建失败: {result.stderr}")
+            return {"success": False, "error": result.stderr, "log": result.stdout}
+        return {"success": True, "image_name": full_image_name, "built": True, "log": result.stdout}
+
+@celery_app.task(name='mcp_app.build_base_image', queue='deploy')
+def build_base_image(force: bool = False) -> Dict[str, Any]:
+    """
+    预先构建（或强制重建）任务Worker共用的基础镜像
+
+    Args:
+        force: 已存在时也重新构建
+
+    Returns:
+        构建结果
+    """
+    try:
+        result = ensure_base_image(force)
+        if result["success"]:
+            result["message"] = f"基础镜像 {result['image_name']} " + ("构建完成" if result["built"] else "已存在")
+        return result
+    except Exception as e:
+        return {"success": False, "error": str(e), "message": "基础镜像构建失败"}
+
 @celery_app.task(name='mcp_app.deploy_code_folder', queue='deploy')
 def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -68,9 +229,12 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
 
     Args:
         deployment_info: 部署信息字典，包含：
+            - deployment_id: MCP服务创建的部署ID（可选），提供时把各阶段状态记录到 mcs:deploy:{id}
             - task_name: 任务名称
             - queue: 队列名称
-            - files_content: 文件内容字典 (文件路径 -> 文件信息)
+            - files_content: 文件内容字典 (文件路径 -> 文件信息，可选)，旧版的内嵌上传方式
+            - artifact: 需要上传的文件打成的制品引用（可选，见 deploy_artifacts），流式解包到部署目录
+            - manifest: 完整文件清单 (文件路径 -> SHA-256摘要，可选)，制品之外的文件从内容存储还原
             - main_file: 主启动文件名
             - dockerfile: Dockerfile文件名
             - source_path: 源路径（仅用于记录）
@@ -85,13 +249,25 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
     Returns:
         部署结果字典
     """
-    deployment_id = str(uuid.uuid4())
+    tracker = DeployStageTracker(artifact_client, deployment_info.get('deployment_id'))
+    result = _deploy_code_folder(deployment_info, tracker)
+    # 缺少文件时由MCP服务补传后重试，上传阶段仍在进行
+    if not result.get('success') and not result.get('missing_blobs'):
+        tracker.fail(result.get('error', '部署失败'))
+    return result
+
+def _deploy_code_folder(deployment_info: Dict[str, Any], tracker: DeployStageTracker) -> Dict[str, Any]:
+    """deploy_code_folder的实现，阶段开始和完成时通过tracker记录（失败由调用方记录）"""
+    deployment_id = deployment_info.get('deployment_id') or str(uuid.uuid4())
     task_name = deployment_info.get('task_name')
     queue = deployment_info.get('queue')
     files_content = deployment_info.get('files_content', {})
+    manifest = deployment_info.get('manifest')
+    artifact = deployment_info.get('artifact')
 
     logger.info(f"开始部署任务 {task_name}，部署ID: {deployment_id}")
-    logger.info(f"接收到 {len(files_content)} 个文件")
+    logger.info(f"接收到 {artifact['files'] if artifact else len(files_content)} 个文件"
+                + (f"，清单共 {len(manifest)} 个文件" if manifest else ""))
 
     try:
         # 1. 创建部署目录 - 使用当前工作目录下的code文件夹
@@ -104,11 +280,58 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
 
         # 2. 写入所有文件内容到部署目录，完全按照原始结构还原
         uploaded_files = []
+        if manifest:
+            # 本次上传的文件直接写入部署目录，核对清单中的摘要后存入内容存储
+            try:
+                received = {}
+                if artifact:
+                    try:
+                        received = extract_artifact(artifact_client, artifact, deployment_path)
+                    finally:
+                        delete_artifact(artifact_client, artifact)
+                for file_path, file_info in files_content.items():
+                    data = decode_file_content(file_info)
+                    dest_file_path = safe_join(deployment_path, file_path)
+                    os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+                    with open(dest_file_path, 'wb') as f:
+                        f.write(data)
+                    received[file_path] = hashlib.sha256(data).hexdigest()
+                for file_path, digest in received.items():
+                    if manifest.get(file_path) != digest:
+                        raise ValueError(f"文件内容与清单不符: {file_path}")
+                    cas_put_file(digest, safe_join(deployment_path, file_path))
+            except Exception as e:
+                shutil.rmtree(deployment_path, ignore_errors=True)
+                return {
+                    "success": False,
+                    "error": f"接收上传文件失败: {e}",
+                    "deployment_id": deployment_id
+                }
+
+            missing_blobs = [digest for file_path, digest in manifest.items()
+                             if file_path not in received and not cas_has(digest)]
+            if missing_blobs:
+                # 例如协商和部署由不同的部署Worker处理，调用方补传这些文件后重试
+                shutil.rmtree(deployment_path, ignore_errors=True)
+                return {
+                    "success": False,
+                    "error": f"内容存储缺少 {len(set(missing_blobs))} 个文件",
+                    "missing_blobs": list(dict.fromkeys(missing_blobs)),
+                    "deployment_id": deployment_id
+                }
+
+            # 其余文件按清单从内容存储还原，保留原始目录结构
+            for file_path, digest in manifest.items():
+                if file_path not in received:
+                    dest_file_path = safe_join(deployment_path, file_path)
+                    os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+                    shutil.copyfile(cas_path(digest), dest_file_path)
+                uploaded_files.append(file_path)
+            files_content = {}
+
         for file_path, file_info in files_content.items():
-            # 提取文件名，去除路径部分
-            # 使用 os.path.basename 获取纯文件名
-            file_name = os.path.basename(file_path)
-            dest_file_path = os.path.join(deployment_path, file_name)
+            # 按原始相对路径还原（保留目录结构，拒绝越出部署目录的路径）
+            dest_file_path = safe_join(deployment_path, file_path)
 
             # 创建文件所在的目录
             dest_dir = os.path.dirname(dest_file_path)
@@ -162,9 +385,27 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
                 "uploaded_files": uploaded_files
             }
 
-        # 4. 构建Docker镜像
+        tracker.done("upload", {"files_processed": len(uploaded_files)})
+
+        # 4. 构建Docker镜像（镜像以代码内容哈希为标签，内容未变化时直接复用）
+        tracker.start("build")
+        build_args = {}
+        if uses_base_image(dockerfile_path):
+            # 生成的Dockerfile基于共用基础镜像构建，传入当前版本的基础镜像名
+            base_result = ensure_base_image()
+            if not base_result["success"]:
+                return {
+                    "success": False,
+                    "error": f"基础镜像构建失败: {base_result.get('error', '未知错误')}",
+                    "deployment_id": deployment_id,
+                    "uploaded_files": uploaded_files,
+                    "build_log": base_result.get("log", "")
+                }
+            build_args[BASE_IMAGE_ARG] = base_result["image_name"]
+
         image_name = f"celery-{task_name.lower().replace('_', '-')}"
-        build_result = build_docker_image(deployment_path, image_name, deployment_id)
+        content_hash = compute_content_hash(deployment_path, manifest, build_args)
+        build_result = build_docker_image(deployment_path, image_name, deployment_id, content_hash, build_args)
 
         if not build_result["success"]:
             return {
@@ -176,8 +417,11 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
             }
 
         docker_image = build_result["image_name"]
+        image_reused = build_result.get("reused", False)
+        tracker.done("build", {"docker_image": docker_image, "image_reused": image_reused})
 
         # 5. 启动容器
+        tracker.start("start")
         container_result = start_container(
             image_name=docker_image,
             container_name=f"{task_name}_{queue}_worker",
@@ -196,9 +440,23 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
             }
 
         container_id = container_result["container_id"]
+        tracker.done("start", {"container_id": container_id})
 
         # 6. 检查worker状态
-        worker_status = check_worker_status(container_id)
+        tracker.start("ready")
+        worker_status, ready_error = wait_for_worker_ready(container_id, queue)
+        if ready_error:
+            return {
+                "success": False,
+                "error": ready_error,
+                "deployment_id": deployment_id,
+                "uploaded_files": uploaded_files,
+                "docker_image": docker_image,
+                "container_id": container_id,
+                "worker_status": worker_status,
+                "message": f"任务 {task_name} 的Worker未就绪，请通过 docker logs {container_id[:12]} 查看原因"
+            }
+        tracker.done("ready", {"worker_status": worker_status})
 
         logger.info(f"部署完成: {task_name}, 容器ID: {container_id}")
 
@@ -207,10 +465,13 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
             "deployment_id": deployment_id,
             "uploaded_files": uploaded_files,
             "docker_image": docker_image,
+            "image_reused": image_reused,
+            "content_hash": content_hash,
             "container_id": container_id,
             "worker_status": worker_status,
             "deployment_path": deployment_path,
-            "files_processed": len(files_content),
+            "files_processed": len(uploaded_files),
+            "files_transferred": artifact['files'] if artifact else len(deployment_info.get('files_content', {})),
             "message": f"任务 {task_name} 部署成功"
         }
 
@@ -223,7 +484,46 @@ def deploy_code_folder(deployment_info: Dict[str, Any], task_info: Dict[str, Any
             "message": f"任务 {task_name} 部署失败"
         }
 
-def build_docker_image(build_path: str, image_name: str, deployment_id: str) -> Dict[str, Any]:
+def compute_content_hash(build_path: str, manifest: Dict[str, str] = None,
+                         build_args: Dict[str, str] = None) -> str:
+    """
+    计算构建目录的内容哈希：所有文件的相对路径及其SHA-256，按路径排序后再做SHA-256
+
+    Args:
+        build_path: 构建路径
+        manifest: 文件清单（路径 -> SHA-256），提供时直接使用，不再重新读取文件
+        build_args: 构建参数（如基础镜像名），同样计入哈希
+
+    Returns:
+        内容哈希（十六进制）
+    """
+    if manifest is None:
+        manifest = {}
+        for root, _, files in os.walk(build_path):
+            for name in files:
+                path = os.path.join(root, name)
+                manifest[Path(os.path.relpath(path, build_path)).as_posix()] = file_digest(path)
+
+    digest = hashlib.sha256()
+    for file_path in sorted(manifest):
+        digest.update(f"{file_path}\0{manifest[file_path]}\n".encode('utf-8'))
+    for name in sorted(build_args or {}):
+        digest.update(f"--build-arg\0{name}={build_args[name]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def image_exists(full_image_name: str) -> bool:
+    """本地是否已有指定的Docker镜像"""
+    try:
+        result = subprocess.run(['docker', 'image', 'inspect', full_image_name],
+                                capture_output=True, text=True, timeout=30)
+        return result.returncode == 0
+    except Exception:
+        return False
+
+
+def build_docker_image(build_path: str, image_name: str, deployment_id: str,
+                       content_hash: str = None, build_args: Dict[str, str] = None) -> Dict[str, Any]:
     """
     构建Docker镜像
 
@@ -231,13 +531,25 @@ def build_docker_image(build_path: str, image_name: str, deployment_id: str) ->
         build_path: 构建路径
         image_name: 镜像名称
         deployment_id: 部署ID
+        content_hash: 构建目录的内容哈希，提供时作为镜像标签，已有该标签的镜像时跳过构建
+        build_args: 构建参数（docker build --build-arg）
 
     Returns:
-        构建结果
+        构建结果（reused 表示复用了已有镜像）
     """
     try:
-        # 添加部署ID作为镜像标签
-        full_image_name = f"{image_name}:{deployment_id}"
+        # 以内容哈希（或部署ID）作为镜像标签
+        tag = content_hash[:16] if content_hash else deployment_id
+        full_image_name = f"{image_name}:{tag}"
+
+        if content_hash and REUSE_IMAGES and image_exists(full_image_name):
+            logger.info(f"代码内容未变化，复用Docker镜像: {full_image_name}")
+            return {
+                "success": True,
+                "image_name": full_image_name,
+                "reused": True,
+                "log": ""
+            }
 
         # 构建Docker镜像
         build_cmd = [
@@ -245,6 +557,11 @@ def build_docker_image(build_path: str, image_name: str, deployment_id: str) ->
             '-t', full_image_name,
             build_path
         ]
+        if content_hash:
+            build_cmd[2:2] = ['--label', f'mcs.content-hash={content_hash}',
+                              '--label', f'mcs.deployment-id={deployment_id}']
+        for name, value in (build_args or {}).items():
+            build_cmd[2:2] = ['--build-arg', f'{name}={value}']
 
         logger.info(f"构建Docker镜像: {' '.join(build_cmd)}")
 
@@ -260,6 +577,7 @@ def build_docker_image(build_path: str, image_name: str, deployment_id: str) ->
             return {
                 "success": True,
                 "image_name": full_image_name,
+                "reused": False,
                 "log": result.stdout
             }
         else:
@@ -313,6 +631,7 @@ def start_container(image_name: str, container_name: str, queue: str, task_name:
             '-e', f'REDIS_BROKER_DB={REDIS_BROKER_DB}',
             '-e', f'REDIS_BACKEND_DB={REDIS_BACKEND_DB}',
             '-e', 'C_FORCE_ROOT=1',
+            *[arg for name, value in codec_environment().items() for arg in ('-e', f'{name}={value}')],
             image_name,
             'celery', '-A', f'app_{queue}', 'worker', '-l', 'info', '-Q', queue
         ]
@@ -377,6 +696,44 @@ def check_worker_status(container_id: str) -> str:
         logger.error(f"检查worker状态失败: {e}")
         return "UNKNOWN"
 
+def queue_has_consumer(queue: str) -> bool:
+    """是否有Worker正在消费该队列（通过broker广播inspect().active_queues()）"""
+    try:
+        replies = celery_app.control.inspect(timeout=READY_POLL_INTERVAL).active_queues() or {}
+    except Exception as e:
+        logger.warning(f"查询队列 {queue} 的消费者失败: {e}")
+        return False
+    return any(q.get('name') == queue for queues in replies.values() for q in queues or [])
+
+def wait_for_worker_ready(container_id: str, queue: str, timeout: float = None):
+    """
+    等待容器内的Worker开始消费队列
+
+    在timeout秒内反复检查：容器退出则立即失败；容器在运行且队列出现消费者即为就绪。
+
+    Args:
+        container_id: 容器ID
+        queue: Worker应消费的队列
+        timeout: 最长等待秒数（默认MCS_DEPLOY_READY_TIMEOUT）
+
+    Returns:
+        (worker状态, 错误信息)，就绪时错误信息为None
+    """
+    timeout = READY_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    worker_status = "UNKNOWN"
+    while True:
+        worker_status = check_worker_status(container_id)
+        if worker_status == "STOPPED":
+            return worker_status, "Worker容器启动后已退出"
+        if worker_status == "RUNNING" and queue_has_consumer(queue):
+            return worker_status, None
+        if time.monotonic() >= deadline:
+            if worker_status == "RUNNING":
+                return worker_status, f"Worker容器在运行，但 {timeout:g} 秒内没有Worker开始消费队列 {queue}"
+            return worker_status, f"{timeout:g} 秒内无法确认Worker容器在运行"
+        time.sleep(READY_POLL_INTERVAL)
+
 @celery_app.task(name='mcp_app.stop_deployed_task', queue='deploy')
 def stop_deployed_task(deployment_id: str, container_name: str = None) -> Dict[str, Any]:
     """
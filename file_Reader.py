@@ -3,6 +3,36 @@ from pathlib import Path
 
 
 class FileReader:
+    # 支持的代码文件扩展名
+    CODE_EXTENSIONS = {
+        '.py', '.js', '.ts', '.jsx', '.tsx', '.html', '.css',
+        '.java', '.cpp', '.c', '.h', '.cs', '.php', '.rb',
+        '.go', '.rs', '.swift', '.kt', '.scala', '.sh',
+        '.sql', '.json', '.xml', '.yaml', '.yml', '.md',
+        '.txt', '.ini', '.conf', '.cfg', '.properties'
+    }
+
+    # 支持的无扩展名文件
+    EXTENSIONLESS_FILES = {
+        'Dockerfile', 'Makefile', 'Jenkinsfile', 'Procfile',
+        'Rakefile', 'Gemfile', 'Vagrantfile', 'Brewfile'
+    }
+
+    def is_code_file(self, file_path):
+        """是否为支持的文件：有支持的扩展名的文件 或 特定的无扩展名文件"""
+        file_path = Path(file_path)
+        return file_path.is_file() and (file_path.suffix.lower() in self.CODE_EXTENSIONS
+                                        or file_path.name in self.EXTENSIONLESS_FILES)
+
+    def list_code_files(self, folder):
+        """列出文件夹中所有支持的文件（不读取内容），返回 {相对folder的路径(使用/分隔): 文件绝对路径}"""
+        folder = Path(folder)
+        return {
+            file_path.relative_to(folder).as_posix(): str(file_path)
+            for file_path in sorted(folder.rglob('*'))
+            if self.is_code_file(file_path)
+        }
+
     def read_single_file(self, work_dir, file_path):
         """读取单个文件内容"""
         try:
@@ -144,31 +174,12 @@ class FileReader:
                     "files": {}
                 }
 
-            # 支持的代码文件扩展名
-            code_extensions = {
-                '.py', '.js', '.ts', '.jsx', '.tsx', '.html', '.css',
-                '.java', '.cpp', '.c', '.h', '.cs', '.php', '.rb',
-                '.go', '.rs', '.swift', '.kt', '.scala', '.sh',
-                '.sql', '.json', '.xml', '.yaml', '.yml', '.md',
-                '.txt', '.ini', '.conf', '.cfg', '.properties'
-            }
-
-            # 支持的无扩展名文件
-            extensionless_files = {
-                'Dockerfile', 'Makefile', 'Jenkinsfile', 'Procfile',
-                'Rakefile', 'Gemfile', 'Vagrantfile', 'Brewfile'
-            }
-
             files_content = {}
             file_count = 0
 
             # 递归读取所有代码文件
             for file_path in target_folder.rglob('*'):
-                # 检查是否是支持的文件：有扩展名的文件 或 特定的无扩展名文件
-                has_valid_extension = file_path.suffix.lower() in code_extensions
-                is_valid_extensionless = file_path.name in extensionless_files
-
-                if file_path.is_file() and (has_valid_extension or is_valid_extensionless):
+                if self.is_code_file(file_path):
                     rel_path = file_path.relative_to(work_path)
 
                     try:
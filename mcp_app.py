@@ -8,6 +8,7 @@ import os
 from celery import Celery
 from urllib.parse import quote
 from Redis.redis_config import get_redis_config
+from celery_codec import TASK_SERIALIZER, ACCEPT_CONTENT
 
 # 使用统一的Redis配置
 redis_config = get_redis_config()
@@ -34,10 +35,11 @@ celery_app = Celery('mcp_app',
 
 # Linux 环境下的 Celery 配置优化
 celery_app.conf.update(
-    # 序列化配置
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # 序列化配置（格式与压缩方式见 celery_codec，由 MCS_SERIALIZER / MCS_COMPRESSION 配置）
+    task_serializer=TASK_SERIALIZER,
+    accept_content=ACCEPT_CONTENT,
+    result_serializer=TASK_SERIALIZER,
+    result_accept_content=ACCEPT_CONTENT,
 
     # 时区配置
     timezone='UTC',
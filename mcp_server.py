@@ -1,19 +1,432 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import asyncio
+import codecs
 import logging
+import os
+import time
+import uuid
 
 import httpx
 import json
-from typing import Any, Dict, Optional, List
-from mcp.server.fastmcp import FastMCP
-from mcp_app import celery_app
-from Redis.redis_client import get_redis_client, get_all_tasks, get_tasks_by_category, get_all_categories, register_celery_task, get_task_info
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, List, Tuple, Union
+from mcp.server.fastmcp import Context, FastMCP
+from celery import group, states
+import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from mcp_app import celery_app, BROKER_URL, BACKEND_URL
+from celery_codec import codec_requirements
+from deploy_artifacts import file_digest, upload_files
+from deploy_status import (DEPLOY_STATUS_TTL, FAILED, PENDING, RUNNING, SUCCESS, deadline_passed,
+                           deploy_status_key, parse_deploy_status, stage_fields)
+from result_blobs import OFFLOAD_THRESHOLD, encode_result, is_blob_ref, read_blob, store_blob_async, ttl_seconds
+from admission import AdmissionController, AdmissionRejected
+from queue_router import QueueRouter
+from result_listener import ResultListener
+from Redis.async_redis_client import get_async_redis_client, get_tasks_page, get_catalog_snapshot, get_catalog_version, get_tasks_by_category, find_tasks, get_task_changes, get_all_categories, register_celery_task, get_task_info
+from Redis.registry_schema import normalize_fields, project_task, queue_list
+from Redis.registry_cache import TaskRegistryCache
+from Redis.result_cache import TaskResultCache
 
 # 创建MCP服务器
 mcp = FastMCP("Demo")
 
-# Redis客户端
-redis_client = get_redis_client()
+# 异步Redis客户端（所有工具共享同一个连接池）
+redis_client = get_async_redis_client()
+
+# 任务路由信息的本地缓存，注册信息变更时通过Redis频道失效
+task_registry_cache = TaskRegistryCache(redis_client, max_size=int(os.getenv('MCS_REGISTRY_CACHE_SIZE', '1024')))
+
+# 可缓存任务（注册时cacheable=True）的结果缓存：本地LRU + Redis
+task_result_cache = TaskResultCache(redis_client, max_size=int(os.getenv('MCS_RESULT_CACHE_SIZE', '1024')))
+
+# 结果轮询配置：首次轮询间隔与退避上限（秒），仅在结果监听不可用时使用
+RESULT_POLL_INTERVAL = float(os.getenv('MCS_RESULT_POLL_INTERVAL', '0.1'))
+RESULT_POLL_MAX_INTERVAL = float(os.getenv('MCS_RESULT_POLL_MAX_INTERVAL', '2.0'))
+
+# 结果后端库的异步客户端：结果监听（pub/sub、GET/MGET）、大结果分块存储和部署状态共用一个连接池
+result_backend_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(BACKEND_URL, max_connections=20))
+
+# 进程内共享的结果监听器：一个pub/sub连接服务所有等待中的任务
+result_listener = ResultListener(BACKEND_URL, celery_app.backend, client=result_backend_client)
+
+# 任务登记了多个等价队列（多个副本）时，按broker中的积压消息数和消费者数量选择队列
+queue_router = QueueRouter(celery_app, BROKER_URL, consumer_ttl=float(os.getenv('MCS_QUEUE_CONSUMER_TTL', '30')))
+
+# 发布任务前的准入控制：每个队列的进行中任务数上限、每个任务名的发布速率（默认均不限制）
+admission_controller = AdmissionController(
+    max_inflight=int(os.getenv('MCS_QUEUE_MAX_INFLIGHT', '0')),
+    queue_limits=json.loads(os.getenv('MCS_QUEUE_MAX_INFLIGHT_OVERRIDES') or '{}'),
+    task_rate=float(os.getenv('MCS_TASK_RATE', '0')),
+    task_burst=float(os.getenv('MCS_TASK_BURST', '0')) or None,
+    task_rates=json.loads(os.getenv('MCS_TASK_RATE_OVERRIDES') or '{}'),
+    max_wait=float(os.getenv('MCS_ADMISSION_MAX_WAIT', '0'))
+)
+# send_celery_task发布的任务最多占用队列额度的秒数（任务一直没有结果时到期释放）
+ADMISSION_SEND_HOLD = float(os.getenv('MCS_ADMISSION_SEND_HOLD', '600'))
+
+# read_result_chunk单次最多读取的字节数（大结果分块保存在结果后端库）
+RESULT_CHUNK_MAX_READ = int(os.getenv('MCS_RESULT_CHUNK_MAX_READ', '1048576'))
+
+# 调用方超时或取消后是否撤销（并终止）已无人等待的任务；deploy_task未指定timeout时的等待上限（秒）
+REVOKE_ABANDONED_TASKS = os.getenv('MCS_REVOKE_ABANDONED_TASKS', '1') != '0'
+DEPLOY_TIMEOUT = float(os.getenv('MCS_DEPLOY_TIMEOUT', '600'))
+
+
+ProgressHandler = Callable[[Dict[str, Any]], None]
+
+
+async def _poll_task_meta(task_id: str, timeout: Optional[float] = None,
+                          on_progress: Optional[ProgressHandler] = None) -> Dict[str, Any]:
+    """轮询结果后端直到任务完成（后端读取放到线程池，两次轮询之间指数退避）"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    interval = RESULT_POLL_INTERVAL
+    last_meta = None
+
+    while True:
+        meta = await asyncio.to_thread(celery_app.backend.get_task_meta, task_id)
+        if meta.get("status") in states.READY_STATES:
+            return meta
+        if on_progress is not None and meta != last_meta:
+            on_progress(meta)
+            last_meta = meta
+        delay = interval
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"等待任务 {task_id} 结果超时")
+            delay = min(delay, remaining)
+        await asyncio.sleep(delay)
+        interval = min(interval * 2, RESULT_POLL_MAX_INTERVAL)
+
+
+async def wait_for_task_meta(task_id: str, timeout: Optional[float] = None,
+                             on_progress: Optional[ProgressHandler] = None) -> Dict[str, Any]:
+    """
+    以非阻塞方式等待Celery任务完成
+
+    优先由结果监听器在任务完成时唤醒；监听连接不可用时退回到轮询。
+    等待期间不阻塞事件循环，协程被取消时立即停止等待。
+
+    Args:
+        task_id: 任务ID
+        timeout: 最长等待秒数（None表示一直等待）
+        on_progress: 进度回调（可选），任务上报中间状态（如PROGRESS）时以任务元数据调用
+
+    Returns:
+        任务元数据字典（status/result/traceback等）
+
+    Raises:
+        asyncio.TimeoutError: 超过timeout仍未完成
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        return await result_listener.wait(task_id, timeout=timeout, on_progress=on_progress)
+    except (RedisError, OSError) as e:
+        logging.warning(f"结果监听不可用，改为轮询任务 {task_id}: {e}")
+        remaining = None if timeout is None else max(timeout - (loop.time() - started), 0)
+        return await _poll_task_meta(task_id, timeout=remaining, on_progress=on_progress)
+
+
+async def wait_for_task_result(task, timeout: Optional[float] = None) -> Any:
+    """
+    等待任务完成并返回结果
+
+    Args:
+        task: celery AsyncResult 对象
+        timeout: 最长等待秒数（None表示一直等待）
+
+    Returns:
+        任务返回值（任务失败时抛出对应异常）
+    """
+    meta = await wait_for_task_meta(task.id, timeout=timeout)
+    return _result_from_meta(task.id, meta)
+
+
+def _result_from_meta(task_id: str, meta: Dict[str, Any]) -> Any:
+    """从任务元数据中取出返回值，任务失败时抛出对应异常"""
+    if meta.get("status") == states.SUCCESS:
+        return meta.get("result")
+    error = meta.get("result")
+    if isinstance(error, BaseException):
+        raise error
+    raise Exception(f"任务 {task_id} 状态为 {meta.get('status')}: {error}")
+
+
+async def _offload_large_result(task_id: Optional[str], result: Any) -> Any:
+    """结果JSON超过阈值时分块保存到结果后端库，返回引用；否则原样返回"""
+    if task_id is None or is_blob_ref(result):
+        return result
+    data = encode_result(result)
+    if data is None or len(data) <= OFFLOAD_THRESHOLD:
+        return result
+    try:
+        return await store_blob_async(result_backend_client, task_id, data, ttl_seconds(celery_app.conf.result_expires))
+    except (RedisError, OSError) as e:
+        logging.warning(f"转存任务 {task_id} 的大结果失败，改为直接返回: {e}")
+        return result
+
+
+async def _offload_meta(task_id: str, meta: Any) -> Any:
+    """成功任务的元数据中的大结果替换为分块引用"""
+    if not isinstance(meta, dict) or meta.get("status") != states.SUCCESS:
+        return meta
+    return {**meta, "result": await _offload_large_result(task_id, meta.get("result"))}
+
+
+def _describe_result(result: Any) -> str:
+    """生成工具返回的结果描述，分块保存的结果只给出预览和读取方式"""
+    if is_blob_ref(result):
+        return (f"结果较大（{result['size']} 字节），已分块保存，"
+                f"请通过 read_result_chunk('{result['mcs_blob']}', offset, length) 读取。预览：{result['preview']}")
+    return f"执行结果：{result}"
+
+
+def _progress_number(value: Any) -> Optional[float]:
+    """任务自定义的进度字段转换为数字，不是数字（如 "50%"）时返回None"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _progress_from_meta(meta: Dict[str, Any]) -> Optional[Tuple[float, Optional[float], Optional[str]]]:
+    """从任务中间状态的元数据中取出 (当前进度, 总量, 说明)，不是进度信息时返回None"""
+    info = meta.get("result")
+    if not isinstance(info, dict):
+        return None
+    current = _progress_number(info.get("current", info.get("progress")))
+    if current is None:
+        return None
+    return current, _progress_number(info.get("total")), info.get("message") or meta.get("status")
+
+
+def _progress_reporter(ctx: Context) -> ProgressHandler:
+    """返回把任务进度转发为MCP进度通知的回调（客户端未请求进度时report_progress不发送任何内容）"""
+    pending = set()
+
+    async def send(progress: Tuple[float, Optional[float], Optional[str]]):
+        try:
+            await ctx.report_progress(*progress)
+        except Exception as e:
+            logging.debug(f"发送进度通知失败: {e}")
+
+    def report(meta: Dict[str, Any]):
+        progress = _progress_from_meta(meta)
+        if progress is None:
+            return
+        task = asyncio.ensure_future(send(progress))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    return report
+
+
+def _deadline_options(timeout: Optional[float]) -> Dict[str, Any]:
+    """
+    把调用方的等待上限转换为Celery发布选项
+
+    expires：超过期限仍未开始执行的任务由worker直接丢弃（状态为REVOKED）；
+    time_limit：开始执行后最多运行的秒数，超出时worker强制结束任务。
+    """
+    if not timeout or timeout <= 0:
+        return {}
+    return {"expires": timeout, "time_limit": timeout}
+
+
+# 后台协程（撤销任务、释放准入额度）的引用，防止执行完之前被回收
+_background_tasks = set()
+
+
+def _run_in_background(coro):
+    """在后台运行协程，不阻塞调用方"""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _revoke_tasks(task_ids: List[str]):
+    """撤销调用方已不再等待的任务：未开始的不再执行，执行中的被终止以释放worker"""
+    if not task_ids or not REVOKE_ABANDONED_TASKS:
+        return
+    try:
+        await asyncio.to_thread(celery_app.control.revoke, task_ids, terminate=True)
+    except Exception as e:
+        logging.warning(f"撤销任务 {task_ids} 失败: {e}")
+
+
+def _revoke_in_background(task_ids: List[str]):
+    """在后台撤销任务（用于取消/清理路径，不阻塞调用方）"""
+    _run_in_background(_revoke_tasks(task_ids))
+
+
+# 期限晚于进行中任务不超过该秒数的调用方仍加入该任务
+DEADLINE_JOIN_SLACK = 1.0
+
+# 进行中的同步触发：(任务名, 队列, 参数) -> {"task_id", "future", "waiters", "progress_handlers", "last_progress", "deadline"}
+# 参数完全相同的并发触发只发布一次Celery任务，所有调用方等待同一个结果
+_inflight_triggers: Dict[tuple, Dict[str, Any]] = {}
+
+
+async def _wait_shared(flight: Dict[str, Any], cache_key: Optional[str], cache_ttl: int) -> Dict[str, Any]:
+    """
+    等待任务完成（不设超时，由调用方各自控制），进度转发给当前所有调用方
+
+    大结果只转存一次；成功且可缓存时写入结果缓存（分块保存的结果不缓存，blob会随结果后端过期）。
+    """
+    task_id = flight["task_id"]
+
+    def fan_out(meta: Dict[str, Any]):
+        flight["last_progress"] = meta
+        for handler in list(flight["progress_handlers"]):
+            try:
+                handler(meta)
+            except Exception as e:
+                logging.warning(f"处理任务 {task_id} 进度失败: {e}")
+
+    meta = await _offload_meta(task_id, await wait_for_task_meta(task_id, on_progress=fan_out))
+    if cache_key and meta.get("status") == states.SUCCESS and not is_blob_ref(meta.get("result")):
+        await task_result_cache.set(cache_key, meta.get("result"), cache_ttl)
+    return meta
+
+
+def _joinable_flight(flight_key: tuple, deadline: Optional[float]) -> Optional[Dict[str, Any]]:
+    """返回可以加入的进行中任务：未结束，且期限不早于调用方期限（允许DEADLINE_JOIN_SLACK秒误差）"""
+    flight = _inflight_triggers.get(flight_key)
+    if flight is None or flight["future"].done():
+        return None
+    if flight["deadline"] is not None and (deadline is None or deadline > flight["deadline"] + DEADLINE_JOIN_SLACK):
+        return None
+    return flight
+
+
+async def _join_trigger(task_name: str, args: list, kwargs: Dict[str, Any], queue: str,
+                        cache_key: Optional[str] = None, cache_ttl: int = 0,
+                        timeout: Optional[float] = None, route_queue: Optional[str] = None) -> Dict[str, Any]:
+    """
+    加入参数相同的进行中任务，没有时经准入控制后发布新任务（发布到route_queue，未指定时为queue）
+
+    queue用于识别相同的调用，因此登记了多个等价队列的任务应传入主队列，实际队列由route_queue给出。
+    加入已有任务不占用准入额度；新任务占用的队列额度在任务结束（或被撤销）时释放。
+
+    任务按首个调用方的timeout设置expires/time_limit，因此只加入期限不早于自身期限的任务
+    （允许DEADLINE_JOIN_SLACK秒的误差，使几乎同时到达的相同调用仍能合并），
+    否则单独发布一个新任务（已有任务继续服务原来的调用方）。
+
+    Raises:
+        AdmissionRejected: 超出准入限制
+    """
+    flight_key = (task_name, queue, json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if _deadline_options(timeout) else None
+    flight = _joinable_flight(flight_key, deadline)
+    if flight is None:
+        release = await admission_controller.acquire(task_name, route_queue or queue, max_wait=timeout)
+        # 排队期间其他调用方可能已经发布了相同的任务
+        flight = _joinable_flight(flight_key, deadline)
+        if flight is not None:
+            if release is not None:
+                release()
+        else:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0.001)
+            try:
+                task = celery_app.send_task('mcp_app.'+task_name, args=args, kwargs=kwargs, queue=route_queue or queue,
+                                            **_deadline_options(remaining))
+            except BaseException:
+                if release is not None:
+                    release()
+                raise
+            flight = {
+                "task_id": task.id,
+                "queue": route_queue or queue,
+                "key": flight_key,
+                "deadline": deadline,
+                "waiters": 0,
+                "progress_handlers": [],
+                "last_progress": None,
+                "revoked": False
+            }
+            flight["future"] = asyncio.ensure_future(_wait_shared(flight, cache_key, cache_ttl))
+            _inflight_triggers[flight_key] = flight
+
+            def on_done(_, flight=flight):
+                if _inflight_triggers.get(flight_key) is flight:
+                    del _inflight_triggers[flight_key]
+                if release is not None:
+                    release()
+
+            flight["future"].add_done_callback(on_done)
+    flight["waiters"] += 1
+    return flight
+
+
+async def _await_trigger(flight: Dict[str, Any], timeout: Optional[float] = None,
+                         on_progress: Optional[ProgressHandler] = None) -> Any:
+    """
+    等待_join_trigger返回的任务结果
+
+    某个调用方超时或被取消不影响其他调用方；最后一个调用方离开时停止共享的等待，
+    并撤销已无人等待的Celery任务（flight["revoked"]置为True）。
+    """
+    try:
+        if on_progress is not None:
+            flight["progress_handlers"].append(on_progress)
+            # 后加入的调用方先收到最近一次进度；转发失败不影响等待结果
+            if flight["last_progress"] is not None:
+                try:
+                    on_progress(flight["last_progress"])
+                except Exception as e:
+                    logging.warning(f"处理任务 {flight['task_id']} 进度失败: {e}")
+        meta = await asyncio.wait_for(asyncio.shield(flight["future"]), timeout)
+    finally:
+        if on_progress is not None and on_progress in flight["progress_handlers"]:
+            flight["progress_handlers"].remove(on_progress)
+        flight["waiters"] -= 1
+        if flight["waiters"] == 0 and not flight["future"].done():
+            flight["future"].cancel()
+            # 取消在下一轮事件循环才生效，先移除以免新的调用方加入即将撤销的任务
+            if _inflight_triggers.get(flight["key"]) is flight:
+                del _inflight_triggers[flight["key"]]
+            flight["revoked"] = REVOKE_ABANDONED_TASKS
+            _revoke_in_background([flight["task_id"]])
+    return _result_from_meta(flight["task_id"], meta)
+
+async def _route_queue(task_info: Optional[Dict[str, Any]]) -> str:
+    """调用方未指定队列时确定发布队列：登记了多个等价队列的任务选择负载最低的一个"""
+    if not task_info:
+        return 'celery'  # 默认队列
+    queues = task_info.get('queues') or [task_info.get('queue', 'celery')]
+    return await queue_router.pick(queues)
+
+def _rejected_response(task_name: str, queue: Optional[str], error: AdmissionRejected) -> Dict[str, Any]:
+    """超出准入限制时工具返回的背压错误"""
+    return {
+        "success": False,
+        "task_id": None,
+        "task_name": task_name,
+        "queue": queue,
+        "status": "REJECTED",
+        "error": str(error),
+        "retry_after": error.retry_after,
+        "message": (f"任务未发布：{error}，请在 {error.retry_after} 秒后重试" if error.retry_after
+                    else f"任务未发布：{error}，请稍后重试")
+    }
+
+
+async def _release_when_done(task_id: str, release: Callable[[], None]):
+    """任务完成（或等待ADMISSION_SEND_HOLD秒后）释放其占用的队列额度"""
+    try:
+        await wait_for_task_meta(task_id, timeout=ADMISSION_SEND_HOLD)
+    except Exception as e:
+        logging.debug(f"任务 {task_id} 未在期限内完成，释放队列额度: {e}")
+    finally:
+        release()
 
 # 简单加法工具
 @mcp.tool()
@@ -23,42 +436,94 @@ def add(a: int, b: int) -> int:
 
 # Celery任务触发器（同步执行，等待结果）
 @mcp.tool()
-async def trigger_celery_task(task_name: str, args: Optional[list] = None, kwargs: Optional[Dict[str, Any]] = None, queue: Optional[str] = None) -> Dict[str, Any]:
+async def trigger_celery_task(task_name: str, args: Optional[list] = None, kwargs: Optional[Dict[str, Any]] = None, queue: Optional[str] = None,
+                              timeout: Optional[float] = None, ctx: Optional[Context] = None) -> Dict[str, Any]:
     """
     触发一次完整的远程Celery任务，并获取对应结果
 
+    任务通过 update_state 上报的进度（PROGRESS状态，meta包含current/total/message）
+    会作为MCP进度通知转发给客户端。
+
     Args:
         task_name: Celery任务名称 (例如: 'myapp.tasks.process_data')
         args: 位置参数列表
         kwargs: 关键字参数字典
-        queue: 指定队列（可选，不指定则从Redis获取）
+        queue: 指定队列（可选，不指定则从Redis获取；任务登记了多个等价队列时选择负载最低的一个）
+        timeout: 等待结果的最长秒数（可选，不指定则一直等待）。同时作为任务的expires/time_limit，
+                 超时或调用被取消且没有其他调用方等待时，任务会被撤销
+        ctx: MCP请求上下文（由FastMCP注入，用于发送进度通知）
 
     Returns:
-        包含任务ID和状态信息的字典
+        包含任务ID和状态信息的字典（结果来自缓存时cached为True，task_id为None；
+        超出准入限制时status为REJECTED，retry_after为建议的重试等待秒数）
     """
+    task_id = None
+    flight = None
+    loop = asyncio.get_running_loop()
+    started = loop.time()
     try:
         args = args or []
         kwargs = kwargs or {}
 
-        # 如果没指定队列，从Redis获取任务信息中的队列
+        # 从任务注册缓存获取队列和缓存策略（未命中时读取Redis）
+        task_info = await task_registry_cache.get(task_name)
+        route_queue = None
         if not queue:
-            task_info = get_task_info(redis_client, task_name)
             if task_info:
                 queue = task_info.get('queue', 'celery')
+                if len(task_info.get('queues') or []) > 1:
+                    route_queue = await _route_queue(task_info)
             else:
                 queue = 'celery'  # 默认队列
 
-        # 异步触发任务
-        task = celery_app.send_task('mcp_app.'+task_name, args=args, kwargs=kwargs, queue=queue)
-        result=task.get()
+        # 可缓存任务相同参数的结果直接从缓存返回，不再分发到worker
+        cache_key = None
+        if task_info and task_info.get('cacheable') and task_info.get('cache_ttl', 0) > 0:
+            cache_key = task_result_cache.make_key(task_name, task_info.get('last_updated'), args, kwargs)
+            hit, result = await task_result_cache.get(cache_key)
+            if hit:
+                return {
+                    "success": True,
+                    "task_id": None,
+                    "task_name": task_name,
+                    "queue": queue,
+                    "status": "SUCCESS",
+                    "cached": True,
+                    "message": _describe_result(result)
+                }
+
+        # 异步触发任务；参数相同的并发调用共享同一个Celery任务，新任务需通过准入控制（排队时间计入timeout）
+        flight = await _join_trigger(task_name, args, kwargs, queue,
+                                     cache_key=cache_key, cache_ttl=task_info['cache_ttl'] if cache_key else 0,
+                                     timeout=timeout, route_queue=route_queue)
+        task_id = flight["task_id"]
+        queue = flight["queue"]
+        remaining = None if timeout is None else max(timeout - (loop.time() - started), 0)
+        result = await _await_trigger(flight, timeout=remaining,
+                                      on_progress=_progress_reporter(ctx) if ctx is not None else None)
         return {
             "success": True,
-            "task_id": task.id,
+            "task_id": task_id,
+            "task_name": task_name,
+            "queue": queue,
+            "status": "SUCCESS",
+            "result_handle": result["mcs_blob"] if is_blob_ref(result) else None,
+            "message": _describe_result(result)
+        }
+    except asyncio.TimeoutError as e:
+        return {
+            "success": False,
+            "task_id": task_id,
             "task_name": task_name,
             "queue": queue,
-            "status": "PENDING",
-            "message": f"执行结果：{result}"
+            "status": "TIMEOUT",
+            "revoked": bool(flight and flight["revoked"]),
+            "error": str(e),
+            "message": (f"等待任务结果超时（{timeout}秒），任务已撤销" if flight and flight["revoked"]
+                        else f"等待任务结果超时（{timeout}秒），可稍后通过 get_celery_result 查询")
         }
+    except AdmissionRejected as e:
+        return _rejected_response(task_name, route_queue or queue, e)
     except Exception as e:
         return {
             "success": False,
@@ -76,25 +541,31 @@ async def send_celery_task(task_name: str, args: Optional[list] = None, kwargs:
         task_name: Celery任务名称 (例如: 'myapp.tasks.process_data')
         args: 位置参数列表
         kwargs: 关键字参数字典
-        queue: 指定队列（可选，不指定则从Redis获取）
+        queue: 指定队列（可选，不指定则从Redis获取；任务登记了多个等价队列时选择负载最低的一个）
 
     Returns:
-        包含任务ID的字典
+        包含任务ID的字典（超出准入限制时status为REJECTED，retry_after为建议的重试等待秒数）
     """
     try:
         args = args or []
         kwargs = kwargs or {}
 
-        # 如果没指定队列，从Redis获取任务信息中的队列
+        # 如果没指定队列，从任务注册缓存获取队列（未命中时读取Redis），多个等价队列时选择负载最低的
         if not queue:
-            task_info = get_task_info(redis_client, task_name)
-            if task_info:
-                queue = task_info.get('queue', 'celery')
-            else:
-                queue = 'celery'  # 默认队列
+            queue = await _route_queue(await task_registry_cache.get(task_name))
+
+        # 准入控制：队列进行中任务数与任务发布速率，超出时排队或拒绝
+        release = await admission_controller.acquire(task_name, queue)
 
-        # 异步发送任务，不等待结果
-        task = celery_app.send_task('mcp_app.'+task_name, args=args, kwargs=kwargs, queue=queue)
+        # 异步发送任务，不等待结果；占用的队列额度在任务完成后释放
+        try:
+            task = celery_app.send_task('mcp_app.'+task_name, args=args, kwargs=kwargs, queue=queue)
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+        if release is not None:
+            _run_in_background(_release_when_done(task.id, release))
 
         return {
             "success": True,
@@ -104,6 +575,8 @@ async def send_celery_task(task_name: str, args: Optional[list] = None, kwargs:
             "status": "SENT",
             "message": f"任务已发送到队列 {queue}，任务ID: {task.id}"
         }
+    except AdmissionRejected as e:
+        return _rejected_response(task_name, queue, e)
     except Exception as e:
         return {
             "success": False,
@@ -111,56 +584,408 @@ async def send_celery_task(task_name: str, args: Optional[list] = None, kwargs:
             "message": f"发送任务失败: {e}"
         }
 
+async def _admit_batch(entries: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Any]:
+    """
+    为批量任务逐个申请准入（每个任务一个队列额度和一个令牌）
+
+    同一队列的任务按顺序申请，不同队列并发申请；整批的排队时间共用一个期限，
+    不会因为任务数多而累加。
+
+    Args:
+        entries: 已解析队列的任务列表（task_name/queue）
+        timeout: 调用方的等待上限（可选）
+
+    Returns:
+        与输入顺序一致的列表，每项为释放函数（可能为None）或AdmissionRejected
+    """
+    loop = asyncio.get_running_loop()
+    max_wait = admission_controller.max_wait if timeout is None else min(timeout, admission_controller.max_wait)
+    deadline = loop.time() + max_wait
+    admitted: List[Any] = [None] * len(entries)
+
+    by_queue: Dict[str, List[int]] = {}
+    for index, entry in enumerate(entries):
+        by_queue.setdefault(entry["queue"], []).append(index)
+
+    async def admit_queue(indexes: List[int]):
+        for index in indexes:
+            try:
+                admitted[index] = await admission_controller.acquire(
+                    entries[index]["task_name"], entries[index]["queue"],
+                    max_wait=max(0.0, deadline - loop.time()))
+            except AdmissionRejected as e:
+                admitted[index] = e
+
+    try:
+        await asyncio.gather(*(admit_queue(indexes) for indexes in by_queue.values()))
+    except BaseException:
+        for release in admitted:
+            if callable(release):
+                release()
+        raise
+    return admitted
+
+async def _dispatch_task_batch(tasks: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    解析队列、经准入控制后以一个Celery group批量发布任务
+
+    未指定队列的任务从本地注册缓存解析，未命中的部分通过一次pipeline从Redis查询；
+    登记了多个等价队列的任务按队列负载选择发布队列（每批每个任务名选择一次）。
+    被准入控制拒绝的任务不发布，其余任务占用的队列额度在各自结束后释放。
+
+    Args:
+        tasks: 任务列表，每项格式如：{"task_name": "...", "args": [], "kwargs": {}, "queue": "可选"}
+        timeout: 调用方的等待上限（可选），作为每个任务的expires/time_limit，也是准入排队的上限
+
+    Returns:
+        与输入顺序一致的任务列表（task_id/task_name/queue）；被拒绝的任务status为REJECTED、task_id为None，
+        并带有error和retry_after
+    """
+    for index, entry in enumerate(tasks):
+        if not isinstance(entry, dict) or not entry.get("task_name"):
+            raise ValueError(f"第 {index} 个任务缺少 task_name")
+
+    # 未指定队列的任务从本地缓存批量解析，未命中的部分一次往返从Redis加载
+    unresolved = list(dict.fromkeys(entry["task_name"] for entry in tasks if not entry.get("queue")))
+    task_infos = await task_registry_cache.get_many(unresolved) if unresolved else {}
+    routes = dict(zip(unresolved, await asyncio.gather(
+        *(_route_queue(task_infos.get(task_name)) for task_name in unresolved))))
+
+    dispatched = []
+    for entry in tasks:
+        task_name = entry["task_name"]
+        dispatched.append({"task_name": task_name, "queue": entry.get("queue") or routes[task_name]})
+
+    # 准入控制：与单个发布相同，每个任务占用一个队列额度和一个速率令牌（排队时间计入timeout）
+    started = asyncio.get_running_loop().time()
+    admitted = await _admit_batch(dispatched, timeout)
+
+    options = _deadline_options(None if timeout is None else
+                                max(timeout - (asyncio.get_running_loop().time() - started), 0.001))
+    signatures = []
+    accepted = []
+    for entry, item, release in zip(tasks, dispatched, admitted):
+        if isinstance(release, AdmissionRejected):
+            item.update({"task_id": None, "status": "REJECTED", "error": str(release),
+                         "retry_after": release.retry_after})
+            continue
+        signatures.append(celery_app.signature('mcp_app.' + item["task_name"],
+                                               args=entry.get("args") or [],
+                                               kwargs=entry.get("kwargs") or {},
+                                               queue=item["queue"], **options))
+        accepted.append((item, release))
+
+    if not signatures:
+        return dispatched
+    try:
+        group_result = group(signatures).apply_async()
+    except BaseException:
+        for _, release in accepted:
+            if release is not None:
+                release()
+        raise
+    for (item, release), task in zip(accepted, group_result.results):
+        item["task_id"] = task.id
+        if release is not None:
+            _run_in_background(_release_when_done(task.id, release))
+    return dispatched
+
+# 批量异步发送Celery任务（不等待结果）
+@mcp.tool()
+async def send_celery_tasks_batch(tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    在一次调用中批量发送多个Celery任务（不等待结果）
+
+    Args:
+        tasks: 任务列表，每项格式如：{"task_name": "...", "args": [], "kwargs": {}, "queue": "可选"}
+
+    Returns:
+        包含每个任务ID的字典（被准入控制拒绝的任务status为REJECTED，retry_after为建议的重试等待秒数）
+    """
+    try:
+        if not tasks:
+            return {
+                "success": False,
+                "error": "任务列表为空",
+                "tasks": [],
+                "message": "请至少提供一个任务"
+            }
+
+        dispatched = await _dispatch_task_batch(tasks)
+        rejected = 0
+        for item in dispatched:
+            if item.get("status") == "REJECTED":
+                rejected += 1
+            else:
+                item["status"] = "SENT"
+
+        sent = len(dispatched) - rejected
+        return {
+            "success": sent > 0,
+            "tasks": dispatched,
+            "count": sent,
+            "rejected": rejected,
+            "message": (f"已批量发送 {sent} 个任务，{rejected} 个超出准入限制未发布，请稍后重试" if rejected
+                        else f"已批量发送 {sent} 个任务")
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "tasks": [],
+            "message": f"批量发送任务失败: {e}"
+        }
+
+# 批量触发Celery任务并并发等待结果
+@mcp.tool()
+async def trigger_celery_tasks_batch(tasks: List[Dict[str, Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    批量触发多个Celery任务，并发等待所有结果
+
+    Args:
+        tasks: 任务列表，每项格式如：{"task_name": "...", "args": [], "kwargs": {}, "queue": "可选"}
+        timeout: 等待结果的最长秒数（可选，不指定则一直等待）。同时作为每个任务的expires/time_limit，
+                 超时的任务会被撤销；准入排队的时间也计入其中
+
+    Returns:
+        包含每个任务状态和结果的字典（被准入控制拒绝的任务status为REJECTED，retry_after为建议的重试等待秒数）
+    """
+    try:
+        if not tasks:
+            return {
+                "success": False,
+                "error": "任务列表为空",
+                "tasks": [],
+                "message": "请至少提供一个任务"
+            }
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await _dispatch_task_batch(tasks, timeout=timeout)
+        dispatched = [item for item in results if item.get("status") != "REJECTED"]
+        rejected = len(results) - len(dispatched)
+        if timeout is not None:
+            timeout = max(timeout - (loop.time() - started), 0)
+        try:
+            metas = await asyncio.gather(
+                *(wait_for_task_meta(item["task_id"], timeout=timeout) for item in dispatched),
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            # 调用被取消，已不会有人读取这些结果
+            _revoke_in_background([item["task_id"] for item in dispatched])
+            raise
+        await _revoke_tasks([item["task_id"] for item, meta in zip(dispatched, metas)
+                             if isinstance(meta, asyncio.TimeoutError)])
+        metas = await asyncio.gather(*(_offload_meta(item["task_id"], meta) for item, meta in zip(dispatched, metas)))
+
+        succeeded = 0
+        for item, meta in zip(dispatched, metas):
+            if isinstance(meta, asyncio.TimeoutError):
+                item.update({"status": "TIMEOUT", "result": None, "revoked": REVOKE_ABANDONED_TASKS,
+                             "error": "等待任务结果超时"})
+            elif isinstance(meta, BaseException):
+                item.update({"status": "UNKNOWN", "result": None, "error": str(meta)})
+            elif meta.get("status") == states.SUCCESS:
+                item.update({"status": states.SUCCESS, "result": meta.get("result"), "error": None})
+                succeeded += 1
+            else:
+                item.update({"status": meta.get("status"), "result": None, "error": str(meta.get("result"))})
+
+        return {
+            "success": True,
+            "tasks": results,
+            "count": len(results),
+            "succeeded": succeeded,
+            "rejected": rejected,
+            "message": (f"批量任务完成：{succeeded}/{len(results)} 个成功，{rejected} 个超出准入限制未发布" if rejected
+                        else f"批量任务完成：{succeeded}/{len(results)} 个成功")
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "tasks": [],
+            "message": f"批量触发任务失败: {e}"
+        }
+
 # 查询Celery任务结果
 @mcp.tool()
-async def get_celery_result(task_id: str) -> Dict[str, Any]:
+async def get_celery_result(task_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
     """
     查询Celery任务的执行结果
 
     Args:
         task_id: 任务ID
+        timeout: 任务未完成时最多等待的秒数（可选，不指定则立即返回当前状态）
 
     Returns:
         包含任务状态和结果的字典
     """
     try:
-        # 根据任务ID获取任务状态
-        task_result = celery_app.AsyncResult(task_id)
+        # 一次读取任务元数据；指定timeout时由结果监听器在任务完成时唤醒
+        meta = None
+        if timeout:
+            try:
+                meta = await wait_for_task_meta(task_id, timeout=timeout)
+            except asyncio.TimeoutError:
+                meta = None
+        if meta is None:
+            meta = await asyncio.to_thread(celery_app.backend.get_task_meta, task_id)
+
+        meta = await _offload_meta(task_id, meta)
+        return {"success": True, **_format_task_meta(task_id, meta)}
 
-        result_info = {
-            "success": True,
+    except Exception as e:
+        return {
+            "success": False,
             "task_id": task_id,
-            "status": task_result.status,
-            "result": None,
-            "error": None
+            "error": str(e),
+            "message": f"查询任务结果失败: {e}"
         }
 
-        if task_result.ready():
-            if task_result.successful():
-                result_info["result"] = task_result.result
-                result_info["message"] = "任务执行成功"
-            else:
-                result_info["error"] = str(task_result.info)
-                result_info["message"] = "任务执行失败"
+def _format_task_meta(task_id: str, meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """将任务元数据转换为工具返回的状态/结果字段（没有记录的任务视为PENDING）"""
+    status = (meta or {}).get("status", states.PENDING)
+    result_info = {
+        "task_id": task_id,
+        "status": status,
+        "result": None,
+        "error": None
+    }
+
+    if status in states.READY_STATES:
+        if status == states.SUCCESS:
+            result_info["result"] = meta.get("result")
+            result_info["message"] = "任务执行成功"
         else:
-            result_info["message"] = f"任务状态: {task_result.status}"
+            result_info["error"] = str(meta.get("result"))
+            result_info["message"] = "任务执行失败"
+    else:
+        result_info["message"] = f"任务状态: {status}"
+        progress = _progress_from_meta(meta) if meta else None
+        if progress is not None:
+            result_info["progress"] = meta.get("result")
+            result_info["message"] = f"任务状态: {status}，进度: {progress[0]:g}" + (f"/{progress[1]:g}" if progress[1] is not None else "")
+
+    return result_info
+
+# 批量查询Celery任务结果
+@mcp.tool()
+async def get_celery_results(task_ids: List[str]) -> Dict[str, Any]:
+    """
+    批量查询多个Celery任务的执行结果（所有结果键通过一次MGET读取）
 
-        return result_info
+    Args:
+        task_ids: 任务ID列表
+
+    Returns:
+        包含每个任务状态和结果的字典
+    """
+    try:
+        if not task_ids:
+            return {
+                "success": False,
+                "error": "任务ID列表为空",
+                "results": [],
+                "message": "请至少提供一个任务ID"
+            }
+
+        try:
+            metas = await result_listener.get_many(task_ids)
+        except (RedisError, OSError) as e:
+            logging.warning(f"结果监听连接不可用，改用结果后端批量读取: {e}")
+            backend = celery_app.backend
+            payloads = await asyncio.to_thread(backend.mget, [backend.get_key_for_task(task_id) for task_id in task_ids])
+            metas = [backend.decode_result(payload) if payload is not None else None for payload in payloads]
+
+        metas = await asyncio.gather(*(_offload_meta(task_id, meta) for task_id, meta in zip(task_ids, metas)))
+        results = [_format_task_meta(task_id, meta) for task_id, meta in zip(task_ids, metas)]
+        counts: Dict[str, int] = {}
+        for item in results:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+
+        return {
+            "success": True,
+            "results": results,
+            "count": len(results),
+            "status_counts": counts,
+            "message": "，".join(f"{status}: {count}" for status, count in counts.items())
+        }
 
     except Exception as e:
         return {
             "success": False,
-            "task_id": task_id,
             "error": str(e),
-            "message": f"查询任务结果失败: {e}"
+            "results": [],
+            "message": f"批量查询任务结果失败: {e}"
+        }
+
+# 分段读取分块保存的大结果
+@mcp.tool()
+async def read_result_chunk(handle: str, offset: int = 0, length: int = 65536) -> Dict[str, Any]:
+    """
+    分段读取分块保存的大结果（结果JSON的UTF-8字节）
+
+    Args:
+        handle: 结果引用中的mcs_blob（即任务ID）
+        offset: 起始字节偏移，首次为0，之后传入上次返回的next_offset
+        length: 最多读取的字节数
+
+    Returns:
+        包含data（本段文本）、next_offset、size和eof的字典
+    """
+    try:
+        length = max(4, min(length, RESULT_CHUNK_MAX_READ))
+        blob = await read_blob(result_backend_client, handle, max(offset, 0), length)
+        data, size = blob["data"], blob["size"]
+
+        # 只返回完整的UTF-8字符，被截断的多字节字符留到下一段
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text = decoder.decode(data, final=offset + len(data) >= size)
+        next_offset = offset + len(data) - len(decoder.getstate()[0])
+
+        return {
+            "success": True,
+            "handle": handle,
+            "offset": offset,
+            "next_offset": next_offset,
+            "size": size,
+            "eof": next_offset >= size,
+            "data": text,
+            "message": f"已读取 {next_offset - offset} 字节（{next_offset}/{size}）"
+        }
+    except KeyError:
+        return {
+            "success": False,
+            "handle": handle,
+            "error": "结果不存在或已过期",
+            "message": f"找不到分块结果: {handle}"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "handle": handle,
+            "error": str(e),
+            "message": f"读取分块结果失败: {e}"
         }
 
 # 获取所有可用的Celery任务信息
 @mcp.tool()
-async def get_available_tasks() -> Dict[str, Any]:
+async def get_available_tasks(cursor: Optional[str] = None, limit: Optional[int] = None,
+                              fields: Optional[List[str]] = None, if_version: Optional[int] = None) -> Dict[str, Any]:
     """
     从Redis获取所有可用的Celery任务信息
 
+    指定cursor或limit时按任务名称分页返回，否则返回全部任务（按分类排序）。
+
+    Args:
+        cursor: 上一页返回的next_cursor（可选）
+        limit: 每页最多返回的任务数（可选，默认100）
+        fields: 只返回的字段（可选），如 ["name", "queue"]；可选字段：
+                name, description, parameters, return_type, category, queue, created_at, last_updated
+        if_version: 上次获取的目录版本号（可选，仅对全量获取有效），目录未变化时只返回not_modified
+
     Returns:
         包含所有可用任务信息的字典
     """
@@ -173,12 +998,35 @@ async def get_available_tasks() -> Dict[str, Any]:
                 "message": "无法连接到Redis服务器"
             }
 
-        tasks = get_all_tasks(redis_client)
+        if cursor or limit:
+            page = await get_tasks_page(redis_client, cursor=cursor, limit=limit or 100, fields=fields)
+            tasks = page["tasks"]
+            return {
+                "success": True,
+                "tasks": tasks,
+                "total_count": len(tasks),
+                "next_cursor": page["next_cursor"],
+                "has_more": page["next_cursor"] is not None,
+                "message": f"成功获取 {len(tasks)} 个可用任务"
+            }
+
+        fields = normalize_fields(fields)
+        snapshot = await get_catalog_snapshot(redis_client, if_version=if_version)
+        if snapshot["not_modified"]:
+            return {
+                "success": True,
+                "not_modified": True,
+                "version": snapshot["version"],
+                "message": "任务目录未变化"
+            }
+
+        tasks = [project_task(task, fields) for task in snapshot["tasks"]]
 
         return {
             "success": True,
             "tasks": tasks,
             "total_count": len(tasks),
+            "version": snapshot["version"],
             "message": f"成功获取 {len(tasks)} 个可用任务"
         }
 
@@ -211,7 +1059,7 @@ async def get_tasks_by_category_name(category: str) -> Dict[str, Any]:
                 "message": "无法连接到Redis服务器"
             }
 
-        tasks = get_tasks_by_category(redis_client, category)
+        tasks = await get_tasks_by_category(redis_client, category)
 
         return {
             "success": True,
@@ -229,12 +1077,95 @@ async def get_tasks_by_category_name(category: str) -> Dict[str, Any]:
             "message": f"获取分类任务失败: {e}"
         }
 
+# 按队列、返回类型、分类组合查询任务
+@mcp.tool()
+async def search_tasks(queue: Optional[str] = None, return_type: Optional[str] = None,
+                       category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    按队列、返回类型、分类组合查询Celery任务（使用Redis索引集合求交集）
+
+    Args:
+        queue: 任务队列（可选）
+        return_type: 返回值类型（可选）
+        category: 任务分类（可选）
+
+    Returns:
+        包含同时满足所有条件的任务信息的字典
+    """
+    try:
+        if not redis_client:
+            return {
+                "success": False,
+                "error": "Redis连接不可用",
+                "tasks": [],
+                "message": "无法连接到Redis服务器"
+            }
+
+        tasks = await find_tasks(redis_client, queue=queue, return_type=return_type, category=category)
+
+        return {
+            "success": True,
+            "tasks": tasks,
+            "count": len(tasks),
+            "message": f"找到 {len(tasks)} 个匹配的任务"
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "tasks": [],
+            "message": f"查询任务失败: {e}"
+        }
+
+# 增量同步任务目录
+@mcp.tool()
+async def get_tasks_changed_since(timestamp: Union[float, str]) -> Dict[str, Any]:
+    """
+    获取指定时间之后注册、更新或删除的任务，用于增量同步任务目录
+
+    Args:
+        timestamp: Unix时间戳或ISO格式时间（如上次返回的timestamp或任务的last_updated）
+
+    Returns:
+        包含变更任务(tasks)、已删除任务名称(removed)、下次同步使用的timestamp和目录版本号的字典
+    """
+    try:
+        if not redis_client:
+            return {
+                "success": False,
+                "error": "Redis连接不可用",
+                "tasks": [],
+                "removed": [],
+                "message": "无法连接到Redis服务器"
+            }
+
+        changes = await get_task_changes(redis_client, timestamp)
+
+        return {
+            "success": True,
+            **changes,
+            "message": f"{len(changes['tasks'])} 个任务有变更，{len(changes['removed'])} 个任务已删除"
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "tasks": [],
+            "removed": [],
+            "message": f"获取任务变更失败: {e}"
+        }
+
 # 获取所有任务分类
 @mcp.tool()
-async def get_task_categories() -> Dict[str, Any]:
+async def get_task_categories(if_version: Optional[int] = None) -> Dict[str, Any]:
     """
     获取所有任务分类
 
+    Args:
+        if_version: 上次获取的目录版本号（可选），目录未变化时只返回not_modified
+
     Returns:
         包含所有分类信息的字典
     """
@@ -247,12 +1178,22 @@ async def get_task_categories() -> Dict[str, Any]:
                 "message": "无法连接到Redis服务器"
             }
 
-        categories = get_all_categories(redis_client)
+        version = await get_catalog_version(redis_client)
+        if if_version is not None and int(if_version) == version:
+            return {
+                "success": True,
+                "not_modified": True,
+                "version": version,
+                "message": "任务目录未变化"
+            }
+
+        categories = await get_all_categories(redis_client)
 
         return {
             "success": True,
             "categories": categories,
             "count": len(categories),
+            "version": version,
             "message": f"成功获取 {len(categories)} 个任务分类"
         }
 
@@ -285,7 +1226,7 @@ async def get_task_details(task_name: str) -> Dict[str, Any]:
                 "message": "无法连接到Redis服务器"
             }
 
-        task_info = get_task_info(redis_client, task_name)
+        task_info = await get_task_info(redis_client, task_name)
 
         if task_info:
             return {
@@ -311,7 +1252,9 @@ async def get_task_details(task_name: str) -> Dict[str, Any]:
 # 注册任务信息到Redis（供Celery端调用）
 @mcp.tool()
 async def register_task_info(task_name: str, description: str, parameters: List[Dict[str, Any]],
-                           return_type: str = "Any", category: str = "general", queue: str = "celery") -> Dict[str, Any]:
+                           return_type: str = "Any", category: str = "general", queue: str = "celery",
+                           cacheable: bool = False, cache_ttl: int = 300,
+                           queues: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     注册任务信息到Redis
 
@@ -322,6 +1265,10 @@ async def register_task_info(task_name: str, description: str, parameters: List[
         return_type: 返回值类型
         category: 任务分类
         queue: 任务队列
+        cacheable: 任务结果是否只由参数决定（确定性任务）；为True时trigger_celery_task会缓存相同参数的结果
+        cache_ttl: 结果缓存有效期（秒），仅cacheable为True时生效
+        queues: 与queue等价的其他队列（可选），同一任务部署到多个队列（多个副本）时填写，
+                未指定队列的调用会发布到积压最少的队列
 
     Returns:
         注册结果
@@ -334,7 +1281,9 @@ async def register_task_info(task_name: str, description: str, parameters: List[
                 "message": "无法连接到Redis服务器"
             }
 
-        success = register_celery_task(redis_client, task_name, description, parameters, return_type, category, queue)
+        success = await register_celery_task(redis_client, task_name, description, parameters, return_type, category, queue,
+                                             cacheable=cacheable, cache_ttl=cache_ttl, queues=queues)
+        task_registry_cache.invalidate(task_name)
 
         if success:
             return {
@@ -433,7 +1382,10 @@ def generate_startMain_code(task_name: str, description: str, parameters: List[D
 ```
 """
 
-    # 4. 返回完整的提示模板
+    # 4. 任务Worker需要与MCP服务相同的消息编解码依赖（由部署Worker维护的基础镜像预装）
+    codec_requirements_info = ", ".join(["celery[redis]", "redis", *codec_requirements()])
+
+    # 5. 返回完整的提示模板
     return f"""
 请严格按照以下模板生成Celery任务代码：
 
@@ -459,6 +1411,8 @@ def generate_startMain_code(task_name: str, description: str, parameters: List[D
 import os
 from celery import Celery
 from urllib.parse import quote
+from celery_codec import TASK_SERIALIZER, ACCEPT_CONTENT
+from result_blobs import BlobResultTask
 
 # 环境变量配置 (优先级高于配置文件)
 REDIS_HOST = os.getenv('REDIS_HOST', '{redis_config["host"]}')
@@ -474,18 +1428,20 @@ encoded_password = quote(REDIS_PASSWORD)
 BROKER_URL = f'redis://:{{encoded_password}}@{{REDIS_HOST}}:{{REDIS_PORT}}/{{REDIS_BROKER_DB}}'
 BACKEND_URL = f'redis://:{{encoded_password}}@{{REDIS_HOST}}:{{REDIS_PORT}}/{{REDIS_BACKEND_DB}}'
 
-# 创建 Celery 应用 - Linux 优化配置
+# 创建 Celery 应用 - Linux 优化配置（BlobResultTask将过大的返回值分块保存）
 celery_app = Celery('mcp_app',
                     broker=BROKER_URL,
-                    backend=BACKEND_URL
+                    backend=BACKEND_URL,
+                    task_cls=BlobResultTask
                     )
 
 # Linux 环境下的 Celery 配置优化
 celery_app.conf.update(
-    # 序列化配置
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # 序列化配置（必须与MCP服务一致）
+    task_serializer=TASK_SERIALIZER,
+    accept_content=ACCEPT_CONTENT,
+    result_serializer=TASK_SERIALIZER,
+    result_accept_content=ACCEPT_CONTENT,
 
     # 时区配置
     timezone='UTC',
@@ -519,7 +1475,22 @@ def {task_name}(参数列表){f" -> {return_type}" if return_type != "Any" else
 #     实现代码
 ```
 
-2. **如果需要额外文件，请生成相应的模块文件**
+2. **Dockerfile（基于部署Worker维护的共用基础镜像，任务依赖单独成层以便缓存）:**
+```dockerfile
+ARG MCS_BASE_IMAGE=mcs-celery-base:latest
+FROM ${{MCS_BASE_IMAGE}}
+
+WORKDIR /app
+
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+
+COPY . .
+
+CMD ["celery", "-A", "app_{queue}", "worker", "-l", "info", "-Q", "{queue}"]
+```
+
+3. **如果需要额外文件，请生成相应的模块文件**
 
 **生成要求：**
 1. 严格按照模板格式
@@ -532,14 +1503,219 @@ def {task_name}(参数列表){f" -> {return_type}" if return_type != "Any" else
 8. 额外的工具函数可以放在单独的模块文件中
 9. 启动文件命名格式：app_{queue}.py
 10. 所有task函数必须使用相同的queue: '{queue}'
-11. 全部代码文件生成完毕后，为主启动文件 (app_{queue}.py)编写dockerfile文件，容器内部的启动命令应为 celery -A app_{queue} worker -l info -Q {queue}
+11. 全部代码文件生成完毕后，按上面的模板为主启动文件 (app_{queue}.py)编写Dockerfile：保留 ARG MCS_BASE_IMAGE / FROM 两行（部署时自动传入当前版本的基础镜像），容器内部的启动命令应为 celery -A app_{queue} worker -l info -Q {queue}
+12. 耗时较长的任务可使用 @celery_app.task(bind=True, ...) 并在执行过程中调用 self.report_progress(current, total, message) 上报进度
+13. 不要生成 celery_codec.py 和 result_blobs.py（部署时自动添加）；基础镜像已预装 {codec_requirements_info}，requirements.txt 只需列出任务自身的额外依赖（没有时生成空文件）
 """
 
+# 清单协商的等待上限（秒），部署Worker没有及时响应时按全部文件缺失处理
+DEPLOY_NEGOTIATE_TIMEOUT = float(os.getenv('MCS_DEPLOY_NEGOTIATE_TIMEOUT', '30'))
+
+
+# 部署制品（需要上传的文件打成的tar.gz，分块保存）所在的Redis（结果后端库），打包在线程池中同步写入
+deploy_artifact_client = redis.Redis.from_url(BACKEND_URL)
+
+
+def _files_for_digests(local_files: Dict[str, str], manifest: Dict[str, str],
+                       digests: List[str]) -> Dict[str, str]:
+    """挑出内容为指定摘要的文件，内容相同的多个文件只取一个"""
+    wanted = set(digests)
+    selected = {}
+    for file_path, digest in manifest.items():
+        if digest in wanted:
+            selected[file_path] = local_files[file_path]
+            wanted.discard(digest)
+    return selected
+
+
+async def _upload_artifact(local_files: Dict[str, str]) -> Dict[str, Any]:
+    """把文件流式打包上传为部署制品（在线程池中执行，内存占用与文件大小无关）"""
+    return await asyncio.to_thread(upload_files, deploy_artifact_client, list(local_files.items()))
+
+
+async def _call_deploy_worker(task_name: str, args: list, timeout: float) -> Any:
+    """
+    调用部署Worker（deploy队列）上的任务并等待结果，超时或调用被取消时撤销该任务
+
+    Raises:
+        asyncio.TimeoutError: 超过timeout仍未完成
+    """
+    task = celery_app.send_task(task_name, args=args, queue="deploy", **_deadline_options(timeout))
+    try:
+        return await wait_for_task_result(task, timeout=timeout)
+    except asyncio.CancelledError:
+        _revoke_in_background([task.id])
+        raise
+    except asyncio.TimeoutError:
+        await _revoke_tasks([task.id])
+        raise
+
+
+async def _negotiate_manifest(manifest: Dict[str, str], timeout: float) -> set:
+    """询问部署Worker的内容存储还缺少哪些文件，协商失败时返回全部摘要（即上传全部文件）"""
+    digests = list(dict.fromkeys(manifest.values()))
+    try:
+        result = await _call_deploy_worker('mcp_app.negotiate_deploy_manifest', [digests], timeout)
+        return set(result.get('missing', digests))
+    except Exception as e:
+        logging.warning(f"部署清单协商失败，上传全部文件: {e}")
+        return set(digests)
+
+# 进行中的部署（部署ID -> 后台协程）
+_deploy_jobs: Dict[str, asyncio.Task] = {}
+# 超过部署期限多少秒仍未结束的部署视为已中断（如MCP服务在部署过程中重启）
+DEPLOY_STATUS_GRACE = 60.0
+
+
+async def _update_deploy_status(deployment_id: str, fields: Dict[str, Any]) -> bool:
+    """写入部署状态记录（结果后端库），失败时只记录日志"""
+    key = deploy_status_key(deployment_id)
+    try:
+        async with result_backend_client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, DEPLOY_STATUS_TTL)
+            await pipe.execute()
+        return True
+    except (RedisError, OSError) as e:
+        logging.warning(f"记录部署 {deployment_id} 的状态失败: {e}")
+        return False
+
+
+async def _fail_deployment(deployment_id: str, error: str):
+    """把部署的当前阶段（及整个部署）标记为失败"""
+    try:
+        stage = await result_backend_client.hget(deploy_status_key(deployment_id), "stage")
+    except (RedisError, OSError):
+        stage = None
+    stage = stage.decode('utf-8') if isinstance(stage, bytes) else (stage or "upload")
+    await _update_deploy_status(deployment_id, stage_fields(stage, FAILED, error=error))
+
+
+async def _run_deployment(deployment_id: str, registration: Dict[str, Any], local_files: Dict[str, str],
+                          code_folder_path: str, deploy_timeout: float):
+    """
+    后台执行部署：按内容摘要协商并上传制品，调用部署Worker构建和启动容器，完成后注册任务
+
+    各阶段状态写入 mcs:deploy:{deployment_id}；构建、启动、就绪阶段由部署Worker记录。
+    """
+    task_name, queue = registration["task_name"], registration["queue"]
+    loop = asyncio.get_running_loop()
+    deploy_deadline = loop.time() + deploy_timeout
+
+    # 1. 按内容摘要协商，只把部署Worker内容存储中没有的文件打包为制品上传
+    try:
+        manifest = await asyncio.to_thread(
+            lambda: {file_path: file_digest(path) for file_path, path in local_files.items()})
+        missing_digests = await _negotiate_manifest(manifest, min(DEPLOY_NEGOTIATE_TIMEOUT, deploy_timeout))
+        artifact = await _upload_artifact(_files_for_digests(local_files, manifest, missing_digests))
+    except Exception as e:
+        logging.error(f"部署 {deployment_id} 上传文件失败: {e}", exc_info=True)
+        await _fail_deployment(deployment_id, f"上传文件失败: {e}")
+        return
+
+    deployment_info = {
+        "deployment_id": deployment_id,
+        "task_name": task_name,
+        "queue": queue,
+        "manifest": manifest,  # 完整文件清单：路径 -> SHA-256
+        "artifact": artifact,
+        "main_file": f"app_{queue}.py",
+        "dockerfile": "Dockerfile",
+        "source_path": code_folder_path,  # 仅用于记录来源
+        "file_count": len(manifest)
+    }
+    task_info = {
+        "name": task_name,
+        "description": registration["description"],
+        "parameters": registration["parameters"],
+        "queue": queue,
+        "category": registration["category"]
+    }
+
+    # 2. 调用部署服务（协商和部署共用deploy_timeout期限）
+    try:
+        for attempt in range(2):
+            result = await _call_deploy_worker('mcp_app.deploy_code_folder', [deployment_info, task_info],
+                                               max(deploy_deadline - loop.time(), 1))
+            if attempt or not result.get('missing_blobs'):
+                break
+            # 协商之后内容存储发生了变化（如由另一个部署Worker处理），补传缺少的文件后重试一次
+            deployment_info["artifact"] = await _upload_artifact(
+                _files_for_digests(local_files, manifest, result['missing_blobs']))
+    except asyncio.TimeoutError:
+        await _fail_deployment(deployment_id, f"部署超时（{deploy_timeout}秒）"
+                               + ("，部署任务已撤销" if REVOKE_ABANDONED_TASKS else ""))
+        return
+    except Exception as deploy_error:
+        await _fail_deployment(deployment_id, f"部署服务调用失败: {deploy_error}")
+        return
+
+    summary = {key: result.get(key) for key in (
+        "docker_image", "image_reused", "container_id", "worker_status", "deployment_path",
+        "files_processed", "files_transferred", "build_log", "container_log") if result.get(key) is not None}
+    await _update_deploy_status(deployment_id, {"result": json.dumps(summary, ensure_ascii=False, default=str)})
+    if not result.get('success'):
+        # 部署Worker已记录失败的阶段，这里补记一次，防止其写入失败
+        await _fail_deployment(deployment_id, result.get('error', '部署失败'))
+        return
+
+    # 3. 部署完成的回调：注册任务
+    await _complete_registration(deployment_id)
+
+
+async def _complete_registration(deployment_id: str):
+    """
+    部署就绪后注册任务（增加副本时保留原有队列，新队列作为等价队列）
+
+    由部署协程在完成时调用，也由 get_deployment_status 在部署协程已不存在（如MCP服务重启）时补做；
+    通过 registered:claimed 字段保证只注册一次。
+    """
+    key = deploy_status_key(deployment_id)
+    try:
+        if not await result_backend_client.hsetnx(key, "registered:claimed", datetime.now().isoformat()):
+            return
+        status = parse_deploy_status(await result_backend_client.hgetall(key))
+    except (RedisError, OSError) as e:
+        logging.warning(f"读取部署 {deployment_id} 的状态失败: {e}")
+        return
+
+    registration = status["registration"]
+    await _update_deploy_status(deployment_id, stage_fields("registered", RUNNING))
+    try:
+        task_name, queue = registration["task_name"], registration["queue"]
+        primary_queue, queues = queue, None
+        if registration.get("add_replica"):
+            existing = await get_task_info(redis_client, task_name)
+            if existing:
+                # 重复部署同一队列的副本时不重复登记
+                primary_queue, queues = existing['queue'], queue_list(existing['queue'], existing['queues'] + [queue])
+        registration_result = await register_task_info(
+            task_name=task_name,
+            description=registration["description"],
+            parameters=registration["parameters"],
+            category=registration["category"],
+            queue=primary_queue,
+            cacheable=registration["cacheable"],
+            cache_ttl=registration["cache_ttl"],
+            queues=queues
+        )
+    except Exception as e:
+        registration_result = {"success": False, "error": str(e)}
+
+    if registration_result.get("success"):
+        fields = stage_fields("registered", SUCCESS, detail={"queue": primary_queue, "queues": queues})
+        fields["status"] = SUCCESS
+    else:
+        fields = stage_fields("registered", FAILED, error=f"注册任务失败: {registration_result.get('error', '未知错误')}")
+    await _update_deploy_status(deployment_id, fields)
+
 # 一键部署服务（MCP工具）- 只负责上传和部署已生成的代码文件夹
 @mcp.tool()
 async def deploy_task(task_name: str, description: str, parameters: List[Dict[str, Any]],
                                  queue: str, category: str = "general",
-                                 code_folder_path: str = None) -> Dict[str, Any]:
+                                 code_folder_path: str = None,
+                                 cacheable: bool = False, cache_ttl: int = 300,
+                                 timeout: Optional[float] = None, add_replica: bool = False) -> Dict[str, Any]:
     """
     部署已生成的代码文件夹到worker节点
 
@@ -553,9 +1729,14 @@ async def deploy_task(task_name: str, description: str, parameters: List[Dict[st
         queue: 指定队列
         category: 任务分类
         code_folder_path: 本地已生成的代码文件夹路径
+        cacheable: 任务结果是否可缓存，参见 register_task_info
+        cache_ttl: 结果缓存有效期（秒）
+        timeout: 部署期限（秒，可选，默认MCS_DEPLOY_TIMEOUT），超时未完成时撤销部署任务
+        add_replica: 为已注册的任务增加一个副本：queue作为等价队列加入任务的queues，
+                     保留原有主队列和其他队列（任务未注册时按普通部署处理）
 
     Returns:
-        部署和注册的完整结果
+        部署ID（立即返回，部署在后台进行，进度通过 get_deployment_status 查询）
     """
     try:
         # 1. 验证代码文件夹路径
@@ -566,153 +1747,81 @@ async def deploy_task(task_name: str, description: str, parameters: List[Dict[st
         import os
         code_folder_path = os.path.abspath(code_folder_path)
 
-        # 2. 使用FileReader读取代码文件夹中的所有文件
-        import importlib
+        # 2. 列出代码文件夹中的所有文件（文件内容在计算摘要和打包上传时流式读取）
         from file_Reader import FileReader
-        file_reader = FileReader()
-
-        # 读取代码文件夹中的所有文件内容
-        read_result = file_reader.read_all_files_in_folder(os.path.dirname(code_folder_path),
-                                                          os.path.basename(code_folder_path))
-
-        if read_result["status"] != "success":
-            return {
-                "success": False,
-                "error": f"读取代码文件夹失败: {read_result['message']}",
-                "code_folder_path": code_folder_path
-            }
-
-        files_content = read_result["files"]
-        if not files_content:
+        if not os.path.isdir(code_folder_path):
+            raise FileNotFoundError(code_folder_path)
+        local_files = FileReader().list_code_files(code_folder_path)
+        if not local_files:
             return {
                 "success": False,
                 "error": "代码文件夹为空或没有找到支持的文件",
                 "code_folder_path": code_folder_path
             }
 
-        # 处理文件路径：去掉顶层目录前缀，保持内部结构
-        processed_files = {}
-        folder_name = os.path.basename(code_folder_path)
-
-        for file_path, file_info in files_content.items():
-            # 去掉顶层目录前缀，保持相对路径结构
-            clean_path = file_path
-            if file_path.startswith(f"{folder_name}\\") or file_path.startswith(f"{folder_name}/"):
-                # Windows路径: "mongodb_deploy\\app.py" -> "app.py"
-                # Linux路径: "mongodb_deploy/app.py" -> "app.py"
-                if '\\' in file_path:
-                    clean_path = file_path[len(folder_name)+1:]  # +1 for the separator
-                else:
-                    clean_path = file_path[len(folder_name)+1:]
-
-            processed_files[clean_path] = file_info
-
-        # 调试信息：打印处理后的文件列表
-        print(f"DEBUG: 处理后的文件列表: {list(processed_files.keys())}")
-
-        files_content = processed_files
-
-        # 调试信息：打印读取到的文件
-        print(f"DEBUG: 读取到的文件列表: {list(files_content.keys())}")
-
-        # 3. 验证必要文件是否存在
-        required_files = [f"app_{queue}.py", "Dockerfile"]
-        missing_files = []
-
-        for required_file in required_files:
-            # 更精确的文件匹配：文件名完全匹配或路径结尾匹配
-            found = any(
-                file_path == required_file or
-                file_path.endswith(f"/{required_file}") or
-                file_path.endswith(f"\\{required_file}") or
-                os.path.basename(file_path) == required_file
-                for file_path in files_content.keys()
-            )
-            if not found:
-                missing_files.append(required_file)
-                print(f"DEBUG: 缺少文件 {required_file}，可用文件: {list(files_content.keys())}")
+        # 任务Worker与MCP服务共用的模块：消息编解码（celery_codec）和大结果分块存储（result_blobs）
+        import celery_codec
+        import result_blobs
+        for shared_module in (celery_codec, result_blobs):
+            local_files.setdefault(os.path.basename(shared_module.__file__), shared_module.__file__)
 
+        # 3. 验证必要文件是否存在（部署目录保留原始目录结构，必要文件须位于代码文件夹顶层）
+        missing_files = [required_file for required_file in (f"app_{queue}.py", "Dockerfile")
+                         if required_file not in local_files]
         if missing_files:
             return {
                 "success": False,
-                "error": f"缺少必要文件: {', '.join(missing_files)}",
+                "error": f"缺少必要文件: {', '.join(missing_files)}（须位于代码文件夹顶层）",
                 "code_folder_path": code_folder_path,
-                "available_files": list(files_content.keys())
+                "available_files": list(local_files.keys())
             }
 
-        # 4. 准备部署信息 - 包含文件内容而不是路径
-        deployment_info = {
+        # 4. 创建部署记录，上传、构建、启动和注册在后台进行，调用方通过 get_deployment_status 查询进度
+        deploy_timeout = timeout or DEPLOY_TIMEOUT
+        deployment_id = str(uuid.uuid4())
+        registration = {
             "task_name": task_name,
-            "queue": queue,
-            "files_content": files_content,  # 传递文件内容
-            "main_file": f"app_{queue}.py",
-            "dockerfile": "Dockerfile",
-            "source_path": code_folder_path,  # 仅用于记录来源
-            "file_count": len(files_content)
-        }
-
-        # 5. 准备任务信息
-        task_info = {
-            "name": task_name,
             "description": description,
             "parameters": parameters,
             "queue": queue,
-            "category": category
+            "category": category,
+            "cacheable": cacheable,
+            "cache_ttl": cache_ttl,
+            "add_replica": add_replica
         }
-
-        # 6. 调用部署服务 - 上传整个代码文件夹
-        try:
-            deploy_task = celery_app.send_task('mcp_app.deploy_code_folder',
-                                              args=[deployment_info, task_info], queue="deploy")
-            result = deploy_task.get(timeout=600)  # 10分钟超时
-        except Exception as deploy_error:
+        fields = {
+            "deployment_id": deployment_id,
+            "task_name": task_name,
+            "queue": queue,
+            "status": RUNNING,
+            "source_path": code_folder_path,
+            "file_count": len(local_files),
+            "created_at": datetime.now().isoformat(),
+            "deadline": time.time() + deploy_timeout,
+            "registration": json.dumps(registration, ensure_ascii=False)
+        }
+        fields.update(stage_fields("upload", RUNNING))
+        if not await _update_deploy_status(deployment_id, fields):
             return {
                 "success": False,
-                "error": f"部署服务调用失败: {str(deploy_error)}",
-                "code_folder_path": code_folder_path,
-                "file_count": len(files_content),
-                "message": "无法连接到部署服务或部署服务执行失败"
+                "error": "无法创建部署记录",
+                "message": "请检查Redis结果后端是否可用"
             }
 
-        if not result.get('success'):
-            return {
-                "success": False,
-                "error": result.get('error', '部署失败'),
-                "deployment_id": result.get('deployment_id'),
-                "build_log": result.get('build_log', ''),
-                "message": f"代码文件夹部署失败: {result.get('message', '未知错误')}"
-            }
-
-        # 7. 自动注册任务到Redis
-        registration_result = await register_task_info(
-            task_name=task_name,
-            description=description,
-            parameters=parameters,
-            category=category,
-            queue=queue
-        )
+        job = asyncio.ensure_future(_run_deployment(deployment_id, registration, local_files, code_folder_path,
+                                                   deploy_timeout))
+        _deploy_jobs[deployment_id] = job
+        job.add_done_callback(lambda _: _deploy_jobs.pop(deployment_id, None))
 
         return {
             "success": True,
+            "deployment_id": deployment_id,
             "task_name": task_name,
-            "deployment_result": result,
-            "deployment_info": deployment_info,
-            "steps": {
-                "file_reading": "SUCCESS",
-                "folder_upload": "SUCCESS" if result.get('success') else "FAILED",
-                "docker_build": "SUCCESS" if result.get('docker_image') else "FAILED",
-                "container_start": "SUCCESS" if result.get('container_id') else "FAILED",
-                "registration": "SUCCESS" if registration_result.get("success") else "FAILED"
-            },
-            "deployment_notes": [
-                f"代码文件夹路径：{code_folder_path}",
-                f"读取文件数量：{deployment_info['file_count']}",
-                f"上传文件数量：{len(result.get('uploaded_files', []))}",
-                f"Docker镜像：{result.get('docker_image', 'N/A')}",
-                f"容器ID：{result.get('container_id', 'N/A')}",
-                f"Worker状态：{result.get('worker_status', 'UNKNOWN')}"
-            ],
-            "message": f"任务 {task_name} 代码文件夹已成功部署"
+            "status": RUNNING,
+            "stage": "upload",
+            "file_count": len(local_files),
+            "timeout": deploy_timeout,
+            "message": f"任务 {task_name} 已开始部署，请使用 get_deployment_status 查询部署进度"
         }
     except FileNotFoundError as e:
         return {
@@ -740,6 +1849,57 @@ async def deploy_task(task_name: str, description: str, parameters: List[Dict[st
 
 
 
+@mcp.tool()
+async def get_deployment_status(deployment_id: str) -> Dict[str, Any]:
+    """
+    查询 deploy_task 发起的部署的进度
+
+    Args:
+        deployment_id: deploy_task 返回的部署ID
+
+    Returns:
+        部署状态：status（RUNNING / SUCCESS / FAILED）、当前阶段 stage，以及每个阶段
+        （upload、build、start、ready、registered）的状态、起止时间、错误和附加信息
+    """
+    key = deploy_status_key(deployment_id)
+    try:
+        status = parse_deploy_status(await result_backend_client.hgetall(key))
+        if status is None:
+            return {
+                "success": False,
+                "error": f"部署 {deployment_id} 不存在或记录已过期",
+                "message": "请检查部署ID是否正确"
+            }
+
+        if deployment_id not in _deploy_jobs and status["status"] == RUNNING:
+            if (status["stages"]["ready"]["state"] == SUCCESS
+                    and status["stages"]["registered"]["state"] == PENDING):
+                # 部署协程已不存在（如MCP服务重启），Worker已就绪但任务尚未注册，在此补做
+                await _complete_registration(deployment_id)
+                status = parse_deploy_status(await result_backend_client.hgetall(key))
+            elif deadline_passed(status, DEPLOY_STATUS_GRACE):
+                await _fail_deployment(deployment_id, "部署未在期限内完成（部署过程已中断）")
+                status = parse_deploy_status(await result_backend_client.hgetall(key))
+
+        status.pop("registration", None)
+        status.pop("deadline", None)
+        messages = {
+            RUNNING: f"部署进行中，当前阶段：{status['stage']}",
+            SUCCESS: f"任务 {status['task_name']} 已部署并注册",
+            FAILED: f"部署失败：{status['error']}"
+        }
+        return {
+            "success": True,
+            **status,
+            "message": messages.get(status["status"], "部署等待中")
+        }
+    except (RedisError, OSError) as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": f"查询部署状态失败: {e}"
+        }
+
 # 直接运行时的入口点
 if __name__ == "__main__":
     print("MCP服务已启动")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按队列负载选择任务队列
+
+同一个任务可以部署多个副本，每个副本的 worker 监听各自的队列，注册时把这些队列
+登记为等价队列（任务信息中的 queues 字段）。发布任务时根据 Redis broker 中各队列的
+积压消息数（LLEN）和各队列的消费者（worker）数量，选择积压最少的队列。
+
+消费者数量通过 Celery 的 inspect 广播获取，代价较高，因此在后台定期刷新并缓存；
+积压消息数每次选择时通过一次 pipeline 读取。
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from kombu.transport.redis import PRIORITY_STEPS, Channel
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class QueueRouter:
+    """在等价队列中选择负载最低的队列"""
+
+    def __init__(self, celery_app, broker_url: str, consumer_ttl: float = 30.0,
+                 inspect_timeout: float = 1.0, max_connections: int = 10):
+        """
+        Args:
+            celery_app: Celery应用，用于inspect广播获取各队列的消费者
+            broker_url: Celery broker 的 Redis URL（队列即broker库中的列表）
+            consumer_ttl: 消费者数量缓存的有效期（秒）
+            inspect_timeout: inspect广播等待worker回复的秒数
+            max_connections: 连接池上限
+        """
+        self.celery_app = celery_app
+        self.consumer_ttl = consumer_ttl
+        self.inspect_timeout = inspect_timeout
+        self._client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(
+            broker_url, max_connections=max_connections))
+        # 队列名 -> 消费者数量；None表示尚未获取到
+        self._consumers: Optional[Dict[str, int]] = None
+        self._consumers_updated = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _queue_keys(queue: str) -> List[str]:
+        """队列在Redis broker中对应的列表键（每个优先级一个）"""
+        return [f"{queue}{Channel.sep}{priority}" if priority else queue for priority in PRIORITY_STEPS]
+
+    def _inspect_consumers(self) -> Dict[str, int]:
+        """广播询问所有worker正在消费的队列，统计每个队列的消费者数量（阻塞调用）"""
+        replies = self.celery_app.control.inspect(timeout=self.inspect_timeout).active_queues() or {}
+        consumers: Dict[str, int] = {}
+        for queues in replies.values():
+            for queue in queues or []:
+                name = queue.get("name")
+                if name:
+                    consumers[name] = consumers.get(name, 0) + 1
+        return consumers
+
+    async def _refresh_consumers(self):
+        try:
+            self._consumers = await asyncio.to_thread(self._inspect_consumers)
+        except Exception as e:
+            logger.warning(f"获取队列消费者失败: {e}")
+        finally:
+            # 失败时同样等待一个周期再重试，避免每次发布都广播
+            self._consumers_updated = time.monotonic()
+
+    def _consumer_counts(self) -> Optional[Dict[str, int]]:
+        """返回缓存的消费者数量，过期时在后台刷新（不阻塞本次选择）"""
+        stale = time.monotonic() - self._consumers_updated >= self.consumer_ttl
+        if stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.ensure_future(self._refresh_consumers())
+        return self._consumers
+
+    async def queue_lengths(self, queues: List[str]) -> List[int]:
+        """一次pipeline读取各队列（含所有优先级）的积压消息数"""
+        async with self._client.pipeline(transaction=False) as pipe:
+            for queue in queues:
+                for key in self._queue_keys(queue):
+                    pipe.llen(key)
+            lengths = await pipe.execute()
+        step = len(PRIORITY_STEPS)
+        return [sum(lengths[i:i + step]) for i in range(0, len(lengths), step)]
+
+    async def pick(self, queues: List[str]) -> str:
+        """
+        选择积压消息数/消费者数最小的队列
+
+        已知没有消费者的队列只在所有队列都没有消费者时才会被选中；消费者信息尚未获取到时
+        按每个队列一个消费者计算。得分相同的队列随机选择，使空闲时的负载均匀分布。
+
+        Args:
+            queues: 等价队列列表（第一个为主队列）
+
+        Returns:
+            选中的队列名，读取队列长度失败时返回主队列
+        """
+        if len(queues) <= 1:
+            return queues[0]
+        try:
+            lengths = await self.queue_lengths(queues)
+        except (RedisError, OSError) as e:
+            logger.warning(f"读取队列长度失败，使用主队列 {queues[0]}: {e}")
+            return queues[0]
+
+        consumers = self._consumer_counts()
+        scores: Dict[str, Any] = {}
+        for queue, length in zip(queues, lengths):
+            count = consumers.get(queue, 0) if consumers else 1
+            scores[queue] = (count == 0, (length + 1) / max(count, 1))
+        best = min(scores.values())
+        return random.choice([queue for queue in queues if scores[queue] == best])
+
+    async def close(self):
+        """停止后台刷新并释放连接"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        await self._client.aclose()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大结果分块存储
+
+超过阈值的任务结果不再内联保存在结果后端，而是编码为JSON后按固定大小切块，
+写入结果后端所在的Redis（每块一个键），结果中只保留一个很小的引用：
+
+    {"mcs_blob": <handle>, "size": <字节数>, "preview": <开头部分内容>}
+
+handle 即任务ID，同一任务的结果只会保存一次。MCP 服务通过 read_result_chunk
+按字节偏移分段读取。任务 Worker 使用 BlobResultTask 作为任务基类时在 Worker 端转存，
+MCP 服务也会对内联返回的大结果做同样的转存，避免单次响应过大。
+
+环境变量：
+    MCS_RESULT_OFFLOAD_THRESHOLD: 结果JSON超过该字节数时转存（默认 65536）
+    MCS_BLOB_CHUNK_SIZE: 每块的字节数（默认 262144）
+
+BlobResultTask 同时提供 report_progress，用于长任务上报进度（PROGRESS 状态），
+MCP 服务在 trigger_celery_task 等待期间把进度转发为 MCP 进度通知。
+
+本文件在部署任务时会随代码一起上传到任务 Worker。
+"""
+import datetime
+import json
+import os
+from typing import Any, Dict, Optional
+
+from celery import Task
+
+BLOB_KEY_PREFIX = "mcs:blob:"
+OFFLOAD_THRESHOLD = int(os.getenv('MCS_RESULT_OFFLOAD_THRESHOLD', '65536'))
+BLOB_CHUNK_SIZE = int(os.getenv('MCS_BLOB_CHUNK_SIZE', '262144'))
+# 引用中预览内容的最大字符数
+PREVIEW_CHARS = 500
+# 没有配置result_expires时blob的默认有效期（秒）
+DEFAULT_BLOB_TTL = 3600
+# 任务上报进度时使用的自定义状态
+PROGRESS_STATE = "PROGRESS"
+
+
+def _meta_key(handle: str) -> str:
+    return f"{BLOB_KEY_PREFIX}{handle}"
+
+
+def _chunk_key(handle: str, index: int) -> str:
+    return f"{BLOB_KEY_PREFIX}{handle}:{index}"
+
+
+def ttl_seconds(value: Any) -> int:
+    """将Celery的result_expires（秒数或timedelta）转换为秒"""
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds())
+    return int(value) if value else DEFAULT_BLOB_TTL
+
+
+def is_blob_ref(value: Any) -> bool:
+    """判断结果是否为分块存储的引用"""
+    return isinstance(value, dict) and "mcs_blob" in value
+
+
+def encode_result(result: Any) -> Optional[bytes]:
+    """将结果编码为UTF-8 JSON，无法编码时返回None"""
+    try:
+        return json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+
+
+def make_ref(handle: str, data: bytes) -> Dict[str, Any]:
+    """构造结果引用"""
+    return {
+        "mcs_blob": handle,
+        "size": len(data),
+        "preview": data[:PREVIEW_CHARS * 4].decode("utf-8", errors="ignore")[:PREVIEW_CHARS]
+    }
+
+
+def _blob_commands(pipe, handle: str, data: bytes, ttl: int, chunk_size: int):
+    """先写所有分块，最后写元数据；读取方以元数据存在作为写入完成的标志"""
+    chunks = 0
+    for index, start in enumerate(range(0, len(data), chunk_size)):
+        pipe.set(_chunk_key(handle, index), data[start:start + chunk_size], ex=ttl)
+        chunks += 1
+    pipe.hset(_meta_key(handle), mapping={"size": len(data), "chunk_size": chunk_size, "chunks": chunks})
+    pipe.expire(_meta_key(handle), ttl)
+
+
+def store_blob(client, handle: str, data: bytes, ttl: int, chunk_size: int = BLOB_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    分块保存数据（同步redis客户端，供任务Worker使用）
+
+    Args:
+        client: redis.Redis 客户端（结果后端所在的库）
+        handle: blob标识（任务ID）
+        data: 要保存的数据
+        ttl: 有效期（秒）
+        chunk_size: 每块字节数
+
+    Returns:
+        结果引用字典
+    """
+    if not client.exists(_meta_key(handle)):
+        pipe = client.pipeline(transaction=True)
+        _blob_commands(pipe, handle, data, ttl, chunk_size)
+        pipe.execute()
+    return make_ref(handle, data)
+
+
+async def store_blob_async(client, handle: str, data: bytes, ttl: int,
+                           chunk_size: int = BLOB_CHUNK_SIZE) -> Dict[str, Any]:
+    """分块保存数据（redis.asyncio客户端，供MCP服务使用），参见 store_blob"""
+    if not await client.exists(_meta_key(handle)):
+        pipe = client.pipeline(transaction=True)
+        _blob_commands(pipe, handle, data, ttl, chunk_size)
+        await pipe.execute()
+    return make_ref(handle, data)
+
+
+async def read_blob(client, handle: str, offset: int, length: int) -> Dict[str, Any]:
+    """
+    按字节范围读取blob，只访问范围内的分块（一次pipeline）
+
+    Args:
+        client: redis.asyncio 客户端
+        handle: blob标识
+        offset: 起始字节偏移
+        length: 最多读取的字节数
+
+    Returns:
+        包含data（bytes）和size的字典
+
+    Raises:
+        KeyError: blob不存在或已过期
+    """
+    meta = await client.hgetall(_meta_key(handle))
+    if not meta:
+        raise KeyError(handle)
+    meta = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in meta.items()}
+    size, chunk_size = meta["size"], meta["chunk_size"]
+
+    end = min(offset + length, size)
+    if offset >= end:
+        return {"data": b"", "size": size}
+
+    pipe = client.pipeline(transaction=False)
+    for index in range(offset // chunk_size, (end - 1) // chunk_size + 1):
+        chunk_start = index * chunk_size
+        pipe.getrange(_chunk_key(handle, index), max(offset - chunk_start, 0), min(end - chunk_start, chunk_size) - 1)
+    parts = await pipe.execute()
+    data = b"".join(part if isinstance(part, bytes) else part.encode("utf-8") for part in parts)
+    if len(data) != end - offset:
+        raise KeyError(handle)
+    return {"data": data, "size": size}
+
+
+class BlobResultTask(Task):
+    """任务基类：返回值超过阈值时转存为分块blob，结果后端中只保存引用；支持上报进度"""
+
+    def report_progress(self, current: float, total: Optional[float] = None, message: Optional[str] = None):
+        """
+        上报任务进度（任务需使用 bind=True 以获得 self）
+
+        Args:
+            current: 当前进度
+            total: 总量（可选）
+            message: 进度说明（可选）
+        """
+        if self.request.id is None:
+            return
+        self.update_state(state=PROGRESS_STATE, meta={"current": current, "total": total, "message": message})
+
+    def __call__(self, *args, **kwargs):
+        result = super().__call__(*args, **kwargs)
+        # 直接调用函数（不经过Worker）时没有任务ID，原样返回
+        if self.request.id is None or is_blob_ref(result):
+            return result
+        client = getattr(self.backend, "client", None)
+        if client is None:
+            return result
+        data = encode_result(result)
+        if data is None or len(data) <= OFFLOAD_THRESHOLD:
+            return result
+        return store_blob(client, self.request.id, data, ttl_seconds(self.app.conf.result_expires))
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Celery结果监听器
+
+Celery 的 Redis 结果后端在保存任务状态时，会同时向频道
+``celery-task-meta-<task_id>`` 发布一条消息。本模块在每个 MCP 服务进程中
+只维护一个 pub/sub 连接，按需订阅正在等待的任务频道，收到完成消息后
+唤醒对应的 asyncio Future，从而避免每个等待者各自轮询结果后端。
+任务通过 update_state 上报的中间状态（如 PROGRESS）会转交给等待者的进度回调。
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from celery import states
+
+logger = logging.getLogger(__name__)
+
+
+class ResultListener:
+    """基于 Redis pub/sub 的多路复用任务结果监听器"""
+
+    def __init__(self, backend_url: str, backend, max_connections: int = 20, reconnect_delay: float = 1.0,
+                 client: Optional[aioredis.Redis] = None):
+        """
+        Args:
+            backend_url: Celery 结果后端的 Redis URL
+            backend: celery_app.backend，用于生成结果键和解码结果
+            max_connections: 连接池上限（含pub/sub连接），超出时排队等待
+            reconnect_delay: 连接异常后的重连间隔（秒）
+            client: 与其他组件共用的结果后端客户端（可选，指定时不再单独创建连接池，
+                    pub/sub连接和GET/MGET都从它的连接池获取，close时也不关闭它）
+        """
+        self.backend_url = backend_url
+        self.backend = backend
+        self.max_connections = max_connections
+        self.reconnect_delay = reconnect_delay
+
+        self._client: Optional[aioredis.Redis] = client
+        self._owns_client = client is None
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._has_channels: Optional[asyncio.Event] = None
+        # task_id -> 等待该任务的Future列表
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        # 频道名 -> task_id
+        self._channels: Dict[bytes, str] = {}
+        # task_id -> 进度回调列表（收到未完成状态的消息时调用）
+        self._progress_handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+
+    def _channel_for(self, task_id: str) -> bytes:
+        key = self.backend.get_key_for_task(task_id)
+        return key if isinstance(key, bytes) else key.encode()
+
+    async def _ensure_started(self):
+        """首次使用时在当前事件循环中建立连接并启动读取协程"""
+        if self._reader_task is not None and not self._reader_task.done():
+            return
+        if self._pubsub is None:
+            if self._client is None:
+                pool = aioredis.BlockingConnectionPool.from_url(self.backend_url, max_connections=self.max_connections)
+                self._client = aioredis.Redis(connection_pool=pool)
+            self._pubsub = self._client.pubsub()
+            self._lock = asyncio.Lock()
+            self._has_channels = asyncio.Event()
+        self._reader_task = asyncio.create_task(self._reader())
+
+    async def _fetch_meta(self, channel: bytes) -> Optional[Dict[str, Any]]:
+        """直接读取一次结果键，用于弥补订阅之前已经发布的结果"""
+        payload = await self._client.get(channel)
+        if payload is None:
+            return None
+        return self.backend.decode_result(payload)
+
+    def _resolve(self, task_id: str, meta: Dict[str, Any]):
+        for future in self._waiters.get(task_id, []):
+            if not future.done():
+                future.set_result(meta)
+
+    def _on_message(self, message: Dict[str, Any]):
+        task_id = self._channels.get(message.get("channel"))
+        if task_id is None:
+            return
+        try:
+            meta = self.backend.decode_result(message["data"])
+        except Exception as e:
+            logger.warning(f"解析任务 {task_id} 结果消息失败: {e}")
+            return
+        if meta.get("status") in states.READY_STATES:
+            self._resolve(task_id, meta)
+        else:
+            self._notify_progress(task_id, meta)
+
+    def _notify_progress(self, task_id: str, meta: Dict[str, Any]):
+        for handler in list(self._progress_handlers.get(task_id, [])):
+            try:
+                handler(meta)
+            except Exception as e:
+                logger.warning(f"处理任务 {task_id} 进度失败: {e}")
+
+    async def _recheck_pending(self):
+        """重连后补查所有等待中的任务，防止断线期间丢失完成通知"""
+        for channel, task_id in list(self._channels.items()):
+            meta = await self._fetch_meta(channel)
+            if meta and meta.get("status") in states.READY_STATES:
+                self._resolve(task_id, meta)
+
+    async def _reader(self):
+        while True:
+            if not self._pubsub.subscribed:
+                self._has_channels.clear()
+                await self._has_channels.wait()
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    self._on_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"结果监听连接异常，{self.reconnect_delay}秒后重试: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await self._recheck_pending()
+                except Exception as recheck_error:
+                    logger.warning(f"补查等待中的任务失败: {recheck_error}")
+
+    async def get_many(self, task_ids: List[str], chunk_size: int = 1000) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量读取任务元数据，每块一次MGET
+
+        Args:
+            task_ids: 任务ID列表
+            chunk_size: 每次MGET的键数
+
+        Returns:
+            与task_ids顺序一致的元数据列表，结果后端中没有记录的任务对应None
+        """
+        await self._ensure_started()
+        metas = []
+        for start in range(0, len(task_ids), chunk_size):
+            keys = [self._channel_for(task_id) for task_id in task_ids[start:start + chunk_size]]
+            payloads = await self._client.mget(keys)
+            metas.extend(self.backend.decode_result(payload) if payload is not None else None for payload in payloads)
+        return metas
+
+    async def wait(self, task_id: str, timeout: Optional[float] = None,
+                   on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        等待任务进入完成状态（SUCCESS/FAILURE/REVOKED）
+
+        Args:
+            task_id: 任务ID
+            timeout: 最长等待秒数（None表示一直等待）
+            on_progress: 进度回调（可选），任务处于未完成状态（如PROGRESS）时以任务元数据调用
+
+        Returns:
+            任务元数据字典（status/result/traceback等）
+
+        Raises:
+            asyncio.TimeoutError: 超时仍未完成
+        """
+        await self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        channel = self._channel_for(task_id)
+
+        try:
+            async with self._lock:
+                waiters = self._waiters.setdefault(task_id, [])
+                waiters.append(future)
+                if on_progress is not None:
+                    self._progress_handlers.setdefault(task_id, []).append(on_progress)
+                if channel not in self._channels:
+                    self._channels[channel] = task_id
+                    await self._pubsub.subscribe(channel)
+                    self._has_channels.set()
+
+            meta = await self._fetch_meta(channel)
+            if meta and meta.get("status") in states.READY_STATES:
+                return meta
+            if meta and on_progress is not None:
+                on_progress(meta)
+
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            async with self._lock:
+                waiters = self._waiters.get(task_id, [])
+                if future in waiters:
+                    waiters.remove(future)
+                handlers = self._progress_handlers.get(task_id, [])
+                if on_progress in handlers:
+                    handlers.remove(on_progress)
+                if not handlers:
+                    self._progress_handlers.pop(task_id, None)
+                if not waiters:
+                    self._waiters.pop(task_id, None)
+                    if self._channels.pop(channel, None) is not None:
+                        try:
+                            await self._pubsub.unsubscribe(channel)
+                        except Exception as e:
+                            logger.warning(f"取消订阅 {channel!r} 失败: {e}")
+
+    async def close(self):
+        """停止监听并释放连接"""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+        self._pubsub = None
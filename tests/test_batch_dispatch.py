@@ -0,0 +1,55 @@
+import asyncio
+
+import mcp_server
+
+
+class FakeGroup:
+    """记录发布的签名，不连接broker"""
+    sent = []
+
+    def __init__(self, signatures):
+        self.signatures = list(signatures)
+
+    def apply_async(self):
+        FakeGroup.sent = self.signatures
+
+        class Result:
+            def __init__(self, index):
+                self.id = f"task-{index}"
+
+        class GroupResult:
+            results = [Result(i) for i in range(len(self.signatures))]
+
+        return GroupResult()
+
+
+def test_batch_routes_replicated_task(monkeypatch):
+    task_infos = {
+        "replicated": {"queue": "q1", "queues": ["q1", "q2"]},
+        "single": {"queue": "s1", "queues": ["s1"]},
+    }
+    picks = []
+
+    async def get_many(task_names):
+        return {task_name: task_infos.get(task_name) for task_name in task_names}
+
+    async def pick(queues):
+        picks.append(list(queues))
+        return queues[-1]
+
+    monkeypatch.setattr(mcp_server.task_registry_cache, "get_many", get_many)
+    monkeypatch.setattr(mcp_server.queue_router, "pick", pick)
+    monkeypatch.setattr(mcp_server, "group", FakeGroup)
+
+    dispatched = asyncio.run(mcp_server._dispatch_task_batch([
+        {"task_name": "replicated", "args": [1]},
+        {"task_name": "replicated", "args": [2]},
+        {"task_name": "replicated", "queue": "manual"},
+        {"task_name": "single"},
+        {"task_name": "unknown"},
+    ]))
+
+    assert [item["queue"] for item in dispatched] == ["q2", "q2", "manual", "s1", "celery"]
+    assert [sig.options["queue"] for sig in FakeGroup.sent] == ["q2", "q2", "manual", "s1", "celery"]
+    # 每批每个任务名只选择一次队列
+    assert picks == [["q1", "q2"], ["s1"]]
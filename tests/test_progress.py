@@ -0,0 +1,53 @@
+from celery import states
+
+import mcp_server
+
+
+def test_progress_from_meta_numeric():
+    meta = {"status": "PROGRESS", "result": {"current": "3", "total": 10, "message": "处理中"}}
+    assert mcp_server._progress_from_meta(meta) == (3.0, 10.0, "处理中")
+
+
+def test_progress_from_meta_non_numeric():
+    assert mcp_server._progress_from_meta({"status": "PROGRESS", "result": {"current": "50%"}}) is None
+    assert mcp_server._progress_from_meta({"status": "PROGRESS", "result": {"progress": "3/10"}}) is None
+    # 总量不是数字时只忽略总量
+    assert mcp_server._progress_from_meta(
+        {"status": "PROGRESS", "result": {"current": 3, "total": "10 个"}}) == (3.0, None, "PROGRESS")
+
+
+def test_format_task_meta_non_numeric_progress():
+    meta = {"status": "PROGRESS", "result": {"current": "50%", "total": "3/10"}}
+    info = mcp_server._format_task_meta("t1", meta)
+    assert info["status"] == "PROGRESS"
+    assert info["message"] == "任务状态: PROGRESS"
+    assert "progress" not in info
+
+    info = mcp_server._format_task_meta("t2", {"status": states.SUCCESS, "result": 1})
+    assert info["result"] == 1
+
+
+def test_late_joiner_replay_failure_does_not_leak():
+    import asyncio
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        flight = {
+            "task_id": "t1",
+            "key": ("task", "celery", "[]"),
+            "future": loop.create_future(),
+            "waiters": 1,
+            "progress_handlers": [],
+            "last_progress": {"status": "PROGRESS", "result": {"current": 1}},
+            "revoked": False
+        }
+
+        def broken(meta):
+            raise RuntimeError("ctx已关闭")
+
+        flight["future"].set_result({"status": states.SUCCESS, "result": 42})
+        assert await mcp_server._await_trigger(flight, on_progress=broken) == 42
+        assert flight["waiters"] == 0
+        assert flight["progress_handlers"] == []
+
+    asyncio.run(run())